@@ -0,0 +1,65 @@
+"""
+Compares the time needed to sort a large wall of :class:`SingleBrick`
+extracting the criteria values brick by brick, in columns with
+:meth:`Criterion.get_values`, and in columns sorted by ``numpy.lexsort``,
+which applies only when every value is a number.
+
+Run it from the root of the repository::
+
+    python benchmarks/columns.py --bricks 50000 --repeat 5
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import random
+import timeit
+
+from sorting import SCENARIOS, make_bricks
+
+from djangobricks.models import BaseWall, Criterion, SORTING_ASC, SORTING_DESC
+
+NUMERIC_SCENARIOS = (
+    ('sticky, least popular', (
+        (Criterion('is_sticky'), SORTING_DESC),
+        (Criterion('popularity'), SORTING_ASC),
+    )),
+)
+
+
+class PerBrickWall(BaseWall):
+    """Reads the values brick by brick and sorts them in Python."""
+    lexsort_threshold = None
+
+    def get_sort_key(self, brick):
+        return super(PerBrickWall, self).get_sort_key(brick)
+
+
+class LexsortWall(BaseWall):
+    """Reads the values in columns and sorts them with NumPy if it can."""
+    lexsort_threshold = 0
+
+
+def run(count, repeat):
+    bricks = make_bricks(count)
+    for name, criteria in SCENARIOS + NUMERIC_SCENARIOS:
+        expected = PerBrickWall(bricks, criteria).sorted
+        times = []
+        for wall_class in (PerBrickWall, BaseWall, LexsortWall):
+            assert wall_class(bricks, criteria).sorted == expected
+            times.append(min(timeit.repeat(
+                lambda: wall_class(bricks, criteria).sorted,
+                number=1, repeat=repeat)))
+        print('%-25s %6d bricks  per brick: %8.2fms  columns: %8.2fms  '
+              'lexsort: %8.2fms  x%.1f' % (
+            name, count, times[0] * 1000, times[1] * 1000, times[2] * 1000,
+            times[0] / times[2]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bricks', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    run(args.bricks, args.repeat)
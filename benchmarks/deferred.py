@@ -0,0 +1,62 @@
+"""
+Compares the time and peak memory needed to build a wall and render its first
+page with and without :attr:`BaseWallFactory.deferred`.
+
+Run it from the root of the repository::
+
+    python benchmarks/deferred.py --objects 20000 --page 20
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+
+from utils import measure, populate, setup_django
+
+
+def run(count, page, repeat):
+    models = setup_django()
+    from djangobricks.models import (
+        BaseWallFactory,
+        Criterion,
+        ListBrick,
+        SingleBrick,
+        SORTING_DESC,
+    )
+
+    class ArticleBrick(SingleBrick):
+        pass
+
+    class VideoBrick(ListBrick):
+        pass
+
+    class Factory(BaseWallFactory):
+        def get_content(self):
+            return (
+                (ArticleBrick, models['Article'].objects.all()),
+                (VideoBrick, models['Video'].objects.order_by('-pub_date')),
+            )
+
+    class DeferredFactory(Factory):
+        deferred = True
+
+    criteria = (
+        (Criterion('is_sticky', max), SORTING_DESC),
+        (Criterion('pub_date', max), SORTING_DESC),
+    )
+    populate(count)
+    for factory_class in (Factory, DeferredFactory):
+        def build():
+            wall = factory_class(criteria).wall()
+            return wall, wall[:page]
+        (wall, bricks), elapsed, peak = measure(build, repeat)
+        print('%-16s %7d objects  wall + [:%d]: %8.2fms  peak: %8.1fKiB' % (
+            factory_class.__name__, count, page, elapsed * 1000, peak / 1024.0))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--objects', type=int, default=20000)
+    parser.add_argument('--page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.objects, args.page, args.repeat)
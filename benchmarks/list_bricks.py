@@ -0,0 +1,52 @@
+"""
+Compares the time, the number of queries and the peak memory needed to build
+the bricks of a large :class:`ListBrick` feed, with the former ``count()``
+and ``list()`` chunking, the streaming chunker and shared items.
+
+Run it from the root of the repository::
+
+    python benchmarks/list_bricks.py --objects 50000
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+
+from utils import measure, populate, setup_django
+
+
+def run(count, repeat):
+    models = setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from djangobricks.models import ListBrick
+
+    class CopiedListBrick(ListBrick):
+        @classmethod
+        def get_bricks_for_queryset(cls, queryset):
+            count = queryset.count()
+            items = list(queryset)
+            return [cls(i) for i in (items[i:i+cls.chunk_size]
+                                     for i in range(0, count, cls.chunk_size))]
+
+    class SharedListBrick(ListBrick):
+        share_items = True
+
+    populate(count)
+    queryset = models['Article'].objects.order_by('-pub_date')
+    for brick_class in (CopiedListBrick, ListBrick, SharedListBrick):
+        with CaptureQueriesContext(connection) as queries:
+            brick_class.get_bricks_for_queryset(queryset.all())
+        bricks, elapsed, peak = measure(
+            lambda: brick_class.get_bricks_for_queryset(queryset.all()), repeat)
+        print('%-16s %7d objects  %5d bricks  queries: %d  time: %8.2fms  '
+              'peak: %8.1fKiB' % (
+            brick_class.__name__, count // 2, len(bricks), len(queries),
+            elapsed * 1000, peak / 1024.0))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--objects', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.objects, args.repeat)
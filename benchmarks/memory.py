@@ -0,0 +1,75 @@
+"""
+Compares the memory taken by each brick, and the peak memory per brick while
+sorting a wall of them, for :class:`SingleBrick` and :class:`ListBrick`, which
+have a ``__dict__``, and for :class:`SlottedSingleBrick` and
+:class:`SlottedListBrick`. The objects themselves are built beforehand and
+are not counted.
+
+Run it from the root of the repository::
+
+    python benchmarks/memory.py --bricks 200000
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import datetime
+import random
+
+from utils import measure, setup_django
+
+
+def run(count):
+    models = setup_django()
+    from djangobricks.models import (
+        BaseWall,
+        Criterion,
+        ListBrick,
+        SingleBrick,
+        SlottedListBrick,
+        SlottedSingleBrick,
+        SORTING_ASC,
+        SORTING_DESC,
+    )
+
+    class ArticleBrick(SingleBrick):
+        pass
+
+    class SlottedArticleBrick(SlottedSingleBrick):
+        __slots__ = ()
+
+    class ArticleListBrick(ListBrick):
+        pass
+
+    class SlottedArticleListBrick(SlottedListBrick):
+        __slots__ = ()
+
+    rng = random.Random(0)
+    start = datetime.datetime(2010, 1, 1)
+    items = [models['Article'](
+        name='object', popularity=rng.randint(0, 1000),
+        pub_date=start + datetime.timedelta(minutes=rng.randint(0, 10 ** 7)),
+        is_sticky=rng.random() < 0.01) for _ in range(count)]
+    criteria = (
+        (Criterion('is_sticky', max), SORTING_DESC),
+        (Criterion('popularity', max), SORTING_ASC),
+    )
+    for brick_class in (ArticleBrick, SlottedArticleBrick,
+                        ArticleListBrick, SlottedArticleListBrick):
+        if hasattr(brick_class, 'chunk_size'):
+            contents = [items[i:i + 1] for i in range(count)]
+        else:
+            contents = items
+        bricks, _, peak = measure(
+            lambda: [brick_class(content) for content in contents])
+        _, _, wall_peak = measure(lambda: BaseWall(bricks, criteria).sorted)
+        print('%-24s %7d bricks  brick: %6.1f bytes  with sorting: %6.1f '
+              'bytes per brick' % (brick_class.__name__, count,
+                                  float(peak) / count,
+                                  float(peak + wall_peak) / count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bricks', type=int, default=200000)
+    args = parser.parse_args()
+    run(args.bricks)
@@ -0,0 +1,67 @@
+"""
+Compares the time needed to read a page of a wall deep into an infinite
+scroll by slicing a :attr:`BaseWallFactory.presorted` wall, that reads every
+row before the page, and with :meth:`BaseWallFactory.get_page` given the
+cursor of the previous page.
+
+Run it from the root of the repository::
+
+    python benchmarks/pages.py --objects 20000 --size 20 --pages 1 10 100
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+
+from utils import measure, populate, setup_django
+
+
+def run(count, size, pages, repeat):
+    models = setup_django()
+    from djangobricks.models import (
+        BaseWallFactory,
+        Criterion,
+        SingleBrick,
+        SORTING_DESC,
+    )
+
+    class Factory(BaseWallFactory):
+        presorted = True
+        fetch_size = size
+
+        def get_content(self):
+            return (
+                (SingleBrick, models['Article'].objects.all()),
+                (SingleBrick, models['Video'].objects.all()),
+            )
+
+    criteria = (
+        (Criterion('is_sticky'), SORTING_DESC),
+        (Criterion('pub_date'), SORTING_DESC),
+    )
+    populate(count, text_length=10)
+    factory = Factory(criteria)
+    cursors = {1: None}
+    cursor = None
+    for number in range(2, max(pages) + 1):
+        _, cursor = factory.get_page(cursor, size)
+        cursors[number] = cursor
+    for number in pages:
+        start = (number - 1) * size
+        sliced = measure(lambda: factory.wall()[start:start + size], repeat)
+        paged = measure(lambda: factory.get_page(cursors[number], size)[0],
+                        repeat)
+        assert ([b.item.pk for b in sliced[0]] ==
+                [b.item.pk for b in paged[0]])
+        print('page %5d of %d  slice: %8.2fms  cursor: %8.2fms  x%.1f' % (
+            number, size, sliced[1] * 1000, paged[1] * 1000,
+            sliced[1] / paged[1]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--objects', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=20)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.objects, args.size, args.pages, args.repeat)
@@ -0,0 +1,87 @@
+"""
+Compares the time needed to build a wall over several querysets when they
+are read one after the other and with :attr:`BaseWallFactory.concurrent` or
+:meth:`BaseWallFactory.awall`.
+
+Each query is delayed to simulate the latency of a database server. Run it
+from the root of the repository::
+
+    python benchmarks/parallel.py --objects 6000 --latency 20
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from utils import measure, populate, setup_django
+
+
+def run(count, latency, repeat):
+    # Threads do not share an in-memory database
+    database = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+    models = setup_django(database)
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from djangobricks.models import (
+        BaseWallFactory,
+        Criterion,
+        ListBrick,
+        SingleBrick,
+        SORTING_DESC,
+    )
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(latency / 1000.0)
+        return execute(sql, params, many, context)
+
+    def add_latency(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    class ArticleBrick(SingleBrick):
+        pass
+
+    class VideoBrick(ListBrick):
+        pass
+
+    class Factory(BaseWallFactory):
+        def get_content(self):
+            # Six querysets, as many content types
+            content = []
+            for low, high in ((0, 333), (334, 666), (667, 1000)):
+                content.extend((
+                    (ArticleBrick, models['Article'].objects.filter(
+                        popularity__range=(low, high))),
+                    (VideoBrick, models['Video'].objects.filter(
+                        popularity__range=(low, high)).order_by('-pub_date')),
+                ))
+            return content
+
+    class ConcurrentFactory(Factory):
+        concurrent = True
+
+    criteria = ((Criterion('pub_date', max), SORTING_DESC),)
+    populate(count)
+    add_latency(None, connection)
+    connection_created.connect(add_latency)
+    builds = (
+        ('sequential', lambda: Factory(criteria).wall()),
+        ('concurrent', lambda: ConcurrentFactory(criteria).wall()),
+        ('awall', lambda: asyncio.run(Factory(criteria).awall())),
+    )
+    for name, build in builds:
+        wall, elapsed, _ = measure(build, repeat)
+        print('%-12s %7d objects  %5d bricks  time: %8.2fms' % (
+            name, count, len(wall), elapsed * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--objects', type=int, default=6000)
+    parser.add_argument('--latency', type=float, default=20,
+                        help='delay of each query in milliseconds')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.objects, args.latency, args.repeat)
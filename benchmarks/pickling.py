@@ -0,0 +1,74 @@
+"""
+Compares the size of a pickled wall, and the time needed to pickle and
+unpickle it, with and without :attr:`BaseWall.compact_pickle`.
+
+Run it from the root of the repository::
+
+    python benchmarks/pickling.py --objects 20000 --page 20
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import pickle
+
+from utils import measure, populate, setup_django
+
+from djangobricks.models import (
+    BaseWall,
+    BaseWallFactory,
+    Criterion,
+    ListBrick,
+    SingleBrick,
+    SORTING_DESC,
+)
+
+
+# The classes are defined at module level, so that they can be unpickled
+
+class ArticleBrick(SingleBrick):
+    pass
+
+
+class VideoBrick(ListBrick):
+    pass
+
+
+class CompactWall(BaseWall):
+    compact_pickle = True
+
+
+def run(count, page, repeat):
+    models = setup_django()
+
+    class Factory(BaseWallFactory):
+        def get_content(self):
+            return (
+                (ArticleBrick, models['Article'].objects.all()),
+                (VideoBrick, models['Video'].objects.order_by('-pub_date')),
+            )
+
+    criteria = (
+        (Criterion('is_sticky', max), SORTING_DESC),
+        (Criterion('pub_date', max), SORTING_DESC),
+    )
+    populate(count)
+    for wall_class in (BaseWall, CompactWall):
+        wall = Factory(criteria, wall_class).wall()
+        wall.sorted
+        data, dump_time, _ = measure(
+            lambda: pickle.dumps(wall, pickle.HIGHEST_PROTOCOL), repeat)
+        _, load_time, _ = measure(lambda: pickle.loads(data), repeat)
+        _, page_time, _ = measure(lambda: pickle.loads(data)[:page], repeat)
+        print('%-10s %7d objects  size: %9.1fKiB  dumps: %8.2fms  '
+              'loads: %8.2fms  loads + [:%d]: %8.2fms' % (
+            wall_class.__name__, count, len(data) / 1024.0, dump_time * 1000,
+            load_time * 1000, page, page_time * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--objects', type=int, default=20000)
+    parser.add_argument('--page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.objects, args.page, args.repeat)
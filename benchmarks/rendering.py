@@ -0,0 +1,66 @@
+"""
+Compares rendering a page of a wall with a ``render_brick`` tag per brick and
+with a single ``render_wall`` tag.
+
+Run it from the root of the repository::
+
+    python benchmarks/rendering.py --objects 2000 --page 50
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+
+from utils import measure, populate, setup_django
+
+
+def run(count, page, repeat):
+    models = setup_django()
+    from django.template import Context, Template
+    from django.test import RequestFactory
+    from djangobricks.models import (
+        BaseWallFactory,
+        Criterion,
+        ListBrick,
+        SingleBrick,
+        SORTING_DESC,
+    )
+
+    class ArticleBrick(SingleBrick):
+        template_name = 'single_brick.html'
+
+    class VideoBrick(ListBrick):
+        template_name = 'list_brick.html'
+
+    class Factory(BaseWallFactory):
+        def get_content(self):
+            return (
+                (ArticleBrick, models['Article'].objects.all()),
+                (VideoBrick, models['Video'].objects.order_by('-pub_date')),
+            )
+
+    populate(count)
+    bricks = Factory(((Criterion('pub_date', max), SORTING_DESC),)).wall()[:page]
+    context = {'bricks': bricks, 'request': RequestFactory().get('/')}
+    templates = (
+        ('render_brick', Template(
+            '{% load bricks %}{% for brick in bricks %}'
+            '{% render_brick brick %}{% endfor %}')),
+        ('render_wall', Template('{% load bricks %}{% render_wall bricks %}')),
+    )
+    results = []
+    for name, template in templates:
+        html, elapsed, _ = measure(
+            lambda: template.render(Context(context)), repeat)
+        results.append(html)
+        print('%-14s %4d bricks  time: %8.2fms  per brick: %7.1fus' % (
+            name, len(bricks), elapsed * 1000, elapsed * 10 ** 6 / len(bricks)))
+    assert results[0] == results[1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--objects', type=int, default=2000)
+    parser.add_argument('--page', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    run(args.objects, args.page, args.repeat)
@@ -0,0 +1,101 @@
+"""
+Compares the sort engine of :class:`BaseWall` with the former
+``cmp_to_key(BaseWall._cmp)`` path, and with the partial sort used when
+only the first page of a wall is sliced.
+
+Run it from the root of the repository::
+
+    python benchmarks/sorting.py --bricks 5000 --page 20 --repeat 5
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import timeit
+from functools import cmp_to_key
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from djangobricks.models import (
+    BaseWall,
+    Criterion,
+    ListBrick,
+    SingleBrick,
+    SORTING_ASC,
+    SORTING_DESC,
+)
+
+
+class Item(object):
+    def __init__(self, popularity, pub_date, is_sticky):
+        self.popularity = popularity
+        self.pub_date = pub_date
+        self.is_sticky = is_sticky
+
+    def callable_popularity(self):
+        return self.popularity
+
+
+def make_bricks(count, list_bricks=False):
+    start = datetime.datetime(2010, 1, 1)
+    items = [Item(random.randint(0, 100),
+                  start + datetime.timedelta(minutes=random.randint(0, 10 ** 6)),
+                  random.random() < 0.05)
+             for _ in range(count)]
+    if list_bricks:
+        return [ListBrick(items[i:i+ListBrick.chunk_size])
+                for i in range(0, count, ListBrick.chunk_size)]
+    return [SingleBrick(item) for item in items]
+
+
+SCENARIOS = (
+    ('newest first', (
+        (Criterion('pub_date', max), SORTING_DESC),
+    )),
+    ('sticky then popular', (
+        (Criterion('is_sticky', max), SORTING_DESC),
+        (Criterion('callable_popularity', max), SORTING_DESC),
+    )),
+    ('sticky, oldest, popular', (
+        (Criterion('is_sticky', max), SORTING_DESC),
+        (Criterion('pub_date', max), SORTING_ASC),
+        (Criterion('popularity', max), SORTING_DESC),
+    )),
+)
+
+
+def run(count, page, repeat):
+    for list_bricks in (False, True):
+        bricks = make_bricks(count, list_bricks)
+        kind = 'ListBrick' if list_bricks else 'SingleBrick'
+        for name, criteria in SCENARIOS:
+            wall = BaseWall(bricks, criteria)
+            cmp_time = min(timeit.repeat(
+                lambda: sorted(bricks, key=cmp_to_key(wall._cmp)),
+                number=1, repeat=repeat))
+            key_time = min(timeit.repeat(
+                lambda: BaseWall(bricks, criteria).sorted,
+                number=1, repeat=repeat))
+            page_time = min(timeit.repeat(
+                lambda: BaseWall(bricks, criteria)[:page],
+                number=1, repeat=repeat))
+            assert wall.sorted == sorted(bricks, key=cmp_to_key(wall._cmp))
+            assert BaseWall(bricks, criteria)[:page] == wall.sorted[:page]
+            print('%-12s %-25s %6d bricks  cmp: %8.2fms  key: %8.2fms  '
+                  'x%-5.1f [:%d]: %8.2fms' % (
+                kind, name, len(bricks), cmp_time * 1000, key_time * 1000,
+                cmp_time / key_time, page, page_time * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bricks', type=int, default=5000)
+    parser.add_argument('--page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    run(args.bricks, args.page, args.repeat)
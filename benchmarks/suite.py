@@ -0,0 +1,264 @@
+"""
+Runs the benchmark suite of the walls and reports the time and the peak
+memory of each case, optionally as JSON to compare releases.
+
+The suite sweeps the number of bricks, the number of criteria, single and
+list bricks of five objects, plain and callable attributes and the length of
+filter chains. It measures ``wall_factory`` on a SQLite database in memory,
+then ``BaseWall.sorted``, ``BaseWall.filter``, ``BaseWall.filter_by`` and
+``render_brick`` on unsaved objects. Sizes of up to a million bricks work,
+given enough memory and time.
+
+Run it from the root of the repository::
+
+    python benchmarks/suite.py --sizes 1000 10000 100000 --json results.json
+    python benchmarks/suite.py --compare results.json --tolerance 0.2
+
+With ``--compare``, the exit status is 1 if a case got slower than the
+baseline by more than the tolerance. With ``--profile``, the cProfile
+statistics of each case are saved in the given directory, to be read with
+:mod:`pstats`.
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import cProfile
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+
+from utils import measure, populate, setup_django
+
+ATTRIBUTES = {
+    'plain': ('is_sticky', 'pub_date', 'popularity'),
+    'callable': ('is_sticky', 'pub_date', 'callable_popularity'),
+}
+FILTER_CHAINS = (1, 3)
+LIST_SIZE = 5
+PAGE = 20
+
+
+def get_criteria(count, attribute):
+    from djangobricks.models import Criterion, SORTING_ASC, SORTING_DESC
+    orders = (SORTING_DESC, SORTING_DESC, SORTING_ASC)
+    names = ATTRIBUTES[attribute][-count:]
+    return tuple((Criterion(name, max), order)
+                 for name, order in zip(names, orders[-count:]))
+
+
+def get_brick_classes():
+    from djangobricks.models import ListBrick, SingleBrick
+
+    class BenchmarkSingleBrick(SingleBrick):
+        template_name = 'single_brick.html'
+
+        def get_context(self, **kwargs):
+            return {'object': self.item}
+
+    class BenchmarkListBrick(ListBrick):
+        template_name = 'list_brick.html'
+        chunk_size = LIST_SIZE
+
+        def get_context(self, **kwargs):
+            return {'object_list': self.items}
+
+    return {'SingleBrick': BenchmarkSingleBrick,
+            'ListBrick': BenchmarkListBrick}
+
+
+def make_bricks(model, brick_class, count, rng):
+    """Returns ``count`` bricks of unsaved objects."""
+    start = datetime.datetime(2010, 1, 1)
+    size = getattr(brick_class, 'chunk_size', 1)
+    items = [model(name='object%d' % i, popularity=rng.randint(0, 1000),
+                   pub_date=start + datetime.timedelta(
+                       minutes=rng.randint(0, 10 ** 7)),
+                   is_sticky=rng.random() < 0.01)
+             for i in range(count * size)]
+    if size == 1:
+        return [brick_class(item) for item in items]
+    return [brick_class(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def popularity(brick):
+    items = getattr(brick, 'items', None) or [brick.item]
+    return items[0].popularity
+
+
+def get_filters(length):
+    """Returns ``length`` callbacks each dropping about a tenth of the bricks."""
+    return [lambda brick, low=100 * (i + 1): popularity(brick) >= low or
+            popularity(brick) < low - 100 for i in range(length)]
+
+
+def iter_cases(sizes, brick_names):
+    """
+    Yields the parameters of each case, as a dictionary, and a function
+    returning the callable to measure, that is built outside of the timing.
+    """
+    from django.test import RequestFactory
+    from djangobricks.models import BaseWall, Criterion, wall_factory
+    from djangobricks.templatetags.bricks import render_brick
+    models = setup_django()
+    brick_classes = get_brick_classes()
+
+    class IndexedWall(BaseWall):
+        # List bricks are filtered only by the criteria declared here
+        indexes = (Criterion('is_sticky', any),)
+
+    for size in sizes:
+        # Enough objects for as many list bricks, holding just the sorted
+        # fields as rows of any size
+        populate(size * max(getattr(brick_classes[name], 'chunk_size', 1)
+                            for name in brick_names), text_length=10)
+        for brick_name in brick_names:
+            brick_class = brick_classes[brick_name]
+            objects = size * getattr(brick_class, 'chunk_size', 1)
+            querysets = [models['Article'].objects.order_by('pk')[:objects // 2],
+                         models['Video'].objects.order_by('pk')[
+                             :objects - objects // 2]]
+            bricks = make_bricks(models['Article'], brick_class, size,
+                                 random.Random(size))
+            for attribute in sorted(ATTRIBUTES):
+                for criteria_count in (1, 2, 3):
+                    criteria = get_criteria(criteria_count, attribute)
+                    params = dict(size=size, brick=brick_name,
+                                  attribute=attribute, criteria=criteria_count)
+                    yield dict(params, benchmark='wall_factory'), (
+                        lambda criteria=criteria, brick_class=brick_class,
+                        querysets=querysets:
+                        lambda: wall_factory(
+                            [queryset.all() for queryset in querysets],
+                            brick_class, criteria).sorted)
+                    yield dict(params, benchmark='sorted'), (
+                        lambda criteria=criteria:
+                        lambda: BaseWall(bricks, criteria).sorted)
+            criteria = get_criteria(3, 'plain')
+            for length in FILTER_CHAINS:
+                def build_filter(length=length):
+                    wall = BaseWall(bricks, criteria)
+                    wall.sorted
+                    filters = get_filters(length)
+
+                    def run():
+                        result = wall
+                        for callback in filters:
+                            result = result.filter(callback)
+                        # Filtered walls are read lazily
+                        return list(result)
+                    return run
+                yield dict(size=size, brick=brick_name, attribute='plain',
+                           criteria=3, filters=length,
+                           benchmark='filter'), build_filter
+
+            def build_filter_by():
+                wall = IndexedWall(bricks, criteria)
+                wall.filter_by(is_sticky=True)
+                return lambda: wall.filter_by(brick_class=brick_class,
+                                              is_sticky=False)
+            yield dict(size=size, brick=brick_name, attribute='plain',
+                       criteria=3, filters=2, benchmark='filter_by'), \
+                build_filter_by
+
+            def build_render():
+                context = {'request': RequestFactory().get('/')}
+                page = BaseWall(bricks, criteria)[:PAGE]
+                return lambda: [render_brick(context, brick) for brick in page]
+            yield dict(size=size, brick=brick_name, attribute='plain',
+                       criteria=3, page=PAGE, benchmark='render_brick'), \
+                build_render
+
+
+def case_name(case):
+    return '-'.join('%s=%s' % (key, case[key]) for key in sorted(case))
+
+
+def run(sizes, brick_names, repeat, profile_dir=None):
+    results = []
+    for case, build in iter_cases(sizes, brick_names):
+        func = build()
+        _, elapsed, peak = measure(func, repeat)
+        case.update(time=elapsed, peak=peak)
+        results.append(case)
+        if profile_dir:
+            profiler = cProfile.Profile()
+            profiler.runcall(func)
+            profiler.dump_stats(os.path.join(
+                profile_dir, case_name(case_key(case)) + '.prof'))
+        print('%-12s %8d %-11s %-8s criteria: %d  filters: %-2s '
+              'time: %10.2fms  peak: %10.1fKiB' % (
+            case['benchmark'], case['size'], case['brick'], case['attribute'],
+            case['criteria'], case.get('filters', '-'), elapsed * 1000,
+            peak / 1024.0))
+    return results
+
+
+def case_key(case):
+    """Returns the parameters of a case, without the measures."""
+    return dict((key, value) for key, value in case.items()
+                if key not in ('time', 'peak'))
+
+
+def get_metadata():
+    import django
+    import djangobricks
+    return {
+        'djangobricks': djangobricks.get_version(),
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.datetime.utcnow().isoformat(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the change of each case from the baseline and returns the number
+    of cases slower by more than ``tolerance``, a fraction of the time.
+    """
+    previous = dict((case_name(case_key(case)), case)
+                    for case in baseline['results'])
+    regressions = 0
+    for case in results:
+        old = previous.get(case_name(case_key(case)))
+        if old is None or not old['time']:
+            continue
+        change = case['time'] / old['time'] - 1
+        flag = ''
+        if change > tolerance:
+            regressions += 1
+            flag = '  REGRESSION'
+        print('%-12s %8d %-11s %-8s criteria: %d  filters: %-2s '
+              'time: %+7.1f%%  peak: %+7.1f%%%s' % (
+            case['benchmark'], case['size'], case['brick'], case['attribute'],
+            case['criteria'], case.get('filters', '-'), change * 100,
+            (case['peak'] / float(old['peak'] or 1) - 1) * 100, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--bricks', nargs='+', choices=['SingleBrick', 'ListBrick'],
+                        default=['SingleBrick', 'ListBrick'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='file to write the results to')
+    parser.add_argument('--compare', help='results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--profile', help='directory for the cProfile stats')
+    args = parser.parse_args()
+    if args.profile and not os.path.isdir(args.profile):
+        os.makedirs(args.profile)
+    results = run(args.sizes, args.bricks, args.repeat, args.profile)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'metadata': get_metadata(), 'results': results},
+                      output, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline), args.tolerance):
+                sys.exit(1)
@@ -0,0 +1,133 @@
+"""
+Helpers shared by the benchmarks that need Django and a database.
+
+Django is configured with a SQLite database, in memory by default, and the
+tables of the benchmark models are created on the fly.
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+_models = {}
+
+
+def setup_django(database=':memory:'):
+    """
+    Configures Django and returns the benchmark models. The tables are
+    created in the given SQLite ``database``, in memory by default.
+    """
+    if _models:
+        return _models
+    from django.conf import settings
+    import django
+    settings.configure(
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                               'NAME': database}},
+        INSTALLED_APPS=['djangobricks'],
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [os.path.join(ROOT_DIR, 'tests', 'templates')],
+            'OPTIONS': {'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.i18n',
+                'django.template.context_processors.request',
+                'django.template.context_processors.static',
+                'django.template.context_processors.tz',
+            ]},
+        }],
+        SECRET_KEY='benchmarks',
+        USE_TZ=False,
+    )
+    django.setup()
+
+    from django.db import connection, models
+
+    class Article(models.Model):
+        name = models.CharField(max_length=32)
+        text = models.TextField()
+        popularity = models.PositiveIntegerField()
+        pub_date = models.DateTimeField()
+        is_sticky = models.BooleanField(default=False)
+
+        class Meta:
+            app_label = 'djangobricks'
+
+        def callable_popularity(self):
+            return self.popularity
+
+    class Video(models.Model):
+        name = models.CharField(max_length=32)
+        url = models.CharField(max_length=200)
+        popularity = models.PositiveIntegerField()
+        pub_date = models.DateTimeField()
+        is_sticky = models.BooleanField(default=False)
+
+        class Meta:
+            app_label = 'djangobricks'
+
+        def callable_popularity(self):
+            return self.popularity
+
+    with connection.schema_editor() as editor:
+        editor.create_model(Article)
+        editor.create_model(Video)
+    _models.update(Article=Article, Video=Video)
+    return _models
+
+
+def populate(count, seed=0, text_length=1200):
+    """
+    Fills the tables with ``count`` objects in total, split between the
+    models, replacing any previous content. The text of the articles is
+    ``text_length`` characters long.
+    """
+    rng = random.Random(seed)
+    text = ('lorem ipsum ' * (text_length // 12 + 1))[:text_length]
+    start = datetime.datetime(2010, 1, 1)
+    Article, Video = _models['Article'], _models['Video']
+    Article.objects.all().delete()
+    Video.objects.all().delete()
+
+    def values():
+        return dict(
+            name='object',
+            popularity=rng.randint(0, 1000),
+            pub_date=start + datetime.timedelta(minutes=rng.randint(0, 10 ** 7)),
+            is_sticky=rng.random() < 0.01,
+        )
+    Article.objects.bulk_create(
+        [Article(text=text, **values()) for _ in range(count // 2)],
+        batch_size=500)
+    Video.objects.bulk_create(
+        [Video(url='http://example.com/video', **values())
+         for _ in range(count - count // 2)],
+        batch_size=500)
+
+
+def measure(func, repeat=1):
+    """
+    Calls ``func`` ``repeat`` times and returns the result of the last call,
+    the best time in seconds and the peak memory in bytes. The memory is
+    traced on a separate call, as tracing slows the code down.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
@@ -0,0 +1,128 @@
+"""
+Asynchronous counterparts of the wall factory, the bricks and the template
+tags.
+
+This module requires Python 3.6.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+
+from django.db import connections
+
+from djangobricks import metrics
+
+
+def _in_thread(func, *args, **kwargs):
+    # Threads of a pool must not leave connections open
+    try:
+        return func(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+def _load_wall(wall):
+    # Slicing a presorted or deferred wall would query the database
+    from djangobricks.models import _load_deferred
+    bricks = wall.sorted
+    if wall._deferred:
+        _load_deferred(bricks)
+    return wall
+
+
+async def get_bricks_for_queryset(brick_class, queryset):
+    """
+    Returns the list of the bricks of the given class for the queryset, as
+    :meth:`BaseBrick.get_bricks_for_queryset` does.
+
+    The queryset is read with ``async for``, and the method is given the
+    list of its objects. Querysets that do not support it, before Django
+    4.1, are read in a thread.
+    """
+    if not hasattr(queryset, '__aiter__'):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, partial(
+            _in_thread, lambda: list(
+                brick_class.get_bricks_for_queryset(queryset))))
+    objects = [obj async for obj in queryset]
+    return list(brick_class.get_bricks_for_queryset(objects))
+
+
+async def _get_measured_bricks(brick, queryset):
+    # The queries of the other querysets run meanwhile, so they are not
+    # counted and the time includes waiting for them
+    from djangobricks.models import _model_label
+    start = metrics.timer()
+    bricks = await brick.aget_bricks_for_queryset(queryset)
+    model = getattr(queryset, 'model', None)
+    tags = {'brick': brick.__name__,
+            'model': _model_label(model) if model is not None else None}
+    metrics.emit('bricks.source.time', metrics.timer() - start, **tags)
+    metrics.emit('bricks.source.bricks', len(bricks), **tags)
+    return bricks
+
+
+async def build_wall(factory):
+    """
+    Builds the wall of the given factory as :meth:`BaseWallFactory.build_wall`
+    does, without blocking the event loop.
+
+    The querysets are read by :meth:`BaseBrick.aget_bricks_for_queryset`,
+    or each one in a thread of its own if the factory is
+    :attr:`BaseWallFactory.concurrent` or :attr:`BaseWallFactory.deferred`.
+    Only the threads query the database in parallel: the asynchronous
+    querysets of Django run their queries one after the other, in a single
+    thread. For that reason, without threads the ``bricks.source.queries``
+    and ``bricks.source.query_time`` metrics are not reported.
+
+    Walls that are :attr:`BaseWallFactory.presorted` or
+    :attr:`BaseWallFactory.deferred` would query the database when sliced,
+    so their bricks are all read and loaded in a thread before the wall is
+    returned.
+    """
+    loop = asyncio.get_event_loop()
+    if factory.presorted:
+        return await loop.run_in_executor(None, partial(
+            _in_thread, lambda: _load_wall(factory.build_wall())))
+    with metrics.timed('bricks.wall.build',
+                       factory=factory.__class__.__name__):
+        content = list(factory._content_iterator())
+        if factory.concurrent or factory.deferred:
+            executor = ThreadPoolExecutor(
+                factory.max_workers or len(content) or 1)
+            try:
+                bricks = await asyncio.gather(*[
+                    loop.run_in_executor(executor, factory._fetch_bricks,
+                                         brick, queryset)
+                    for brick, queryset in content])
+            finally:
+                executor.shutdown(wait=False)
+        elif metrics._callbacks:
+            bricks = await asyncio.gather(*[
+                _get_measured_bricks(brick, queryset)
+                for brick, queryset in content])
+        else:
+            bricks = await asyncio.gather(*[
+                brick.aget_bricks_for_queryset(queryset)
+                for brick, queryset in content])
+        wall = factory.wall_class(list(chain.from_iterable(bricks)),
+                                  factory.criteria)
+        wall._deferred = factory.deferred
+        if factory.deferred:
+            await loop.run_in_executor(None, partial(
+                _in_thread, _load_wall, wall))
+        return wall
+
+
+async def arender_bricks(bricks, request=None, **extra_context):
+    """
+    Renders the given bricks as
+    :func:`djangobricks.templatetags.bricks.render_bricks` does, in a single
+    thread for the whole list, since templates might query the database.
+    """
+    from djangobricks.templatetags.bricks import render_bricks
+    bricks = list(bricks)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, partial(
+        _in_thread, render_bricks, bricks, request, **extra_context))
@@ -0,0 +1,163 @@
+"""
+Caching of the walls and of the rendered bricks.
+
+The walls of the factories that define a :attr:`BaseWallFactory.cache_key`
+are cached by :func:`get_cached_wall`.
+
+The HTML of the bricks that define a :attr:`BaseBrick.cache_timeout` is
+cached with the key returned by :meth:`BaseBrick.get_cache_key`. For each
+object, an index keeps the keys of the cached bricks holding it, so that they
+can be deleted when the object is saved, see :func:`connect_fragment_cache`.
+"""
+from __future__ import unicode_literals
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+
+from djangobricks import metrics
+from djangobricks.models import _compact_brick, _model_label
+
+
+#: The number of seconds between two reads of the cache while waiting for
+#: another process to build a wall.
+WAIT_INTERVAL = 0.05
+
+
+def get_cached_wall(factory, key):
+    """
+    Returns the wall of the given factory stored in the cache with the given
+    key, building and storing it if needed.
+
+    The wall is stored along with the time it expires at, after
+    :attr:`BaseWallFactory.cache_timeout` seconds, and kept in the cache for
+    :attr:`BaseWallFactory.cache_stale_timeout` seconds more. Only the
+    process that gets a lock rebuilds an expired wall, while the others keep
+    serving the expired one. When there is no wall at all, the others wait
+    for it up to :attr:`BaseWallFactory.cache_lock_timeout` seconds.
+    """
+    cache = caches[factory.cache_alias]
+    lock_key = '%s:lock' % key
+    lock_timeout = factory.cache_lock_timeout
+    entry = cache.get(key)
+    if entry is not None:
+        expires, wall = entry
+        if expires > time.time() or not cache.add(lock_key, True, lock_timeout):
+            return wall
+        locked = True
+    else:
+        locked = cache.add(lock_key, True, lock_timeout)
+        deadline = time.time() + lock_timeout
+        while not locked and time.time() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+    try:
+        wall = factory.build_wall()
+        cache.set(key, (time.time() + factory.cache_timeout, wall),
+                  factory.cache_timeout + factory.cache_stale_timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return wall
+
+
+def _get_index_key(model, pk):
+    return 'djangobricks:index:%s:%s' % (
+        _model_label(model._meta.concrete_model), pk)
+
+
+def _get_index_keys(brick):
+    compact = _compact_brick(brick)
+    if compact is None:
+        return []
+    _, model, pks = compact
+    if not isinstance(pks, list):
+        pks = [pks]
+    return [_get_index_key(model, pk) for pk in pks]
+
+
+def _store(cache, entries, timeout):
+    """
+    Sets the given ``(brick, key, html)`` entries in the cache and adds their
+    keys to the index of each object.
+    """
+    cache.set_many(dict((key, html) for _, key, html in entries), timeout)
+    index = {}
+    for brick, key, _ in entries:
+        for index_key in _get_index_keys(brick):
+            index.setdefault(index_key, set()).add(key)
+    current = cache.get_many(list(index))
+    cache.set_many(dict((index_key, list(keys.union(current.get(index_key, ()))))
+                        for index_key, keys in index.items()), timeout)
+
+
+def render_cached(bricks, extra_context, render):
+    """
+    Returns the list of the rendered bricks.
+
+    The bricks that can be cached are read from their cache, with a single
+    ``get_many`` for each cache, the others are passed on to ``render``,
+    a function that returns the list of their HTML, and stored.
+    """
+    keys = [brick.get_cache_key(extra_context)
+            if brick.cache_timeout is not None else None for brick in bricks]
+    by_alias = {}
+    for brick, key in zip(bricks, keys):
+        if key is not None:
+            by_alias.setdefault(brick.cache_alias, []).append(key)
+    found = {}
+    for alias, alias_keys in by_alias.items():
+        found.update(caches[alias].get_many(alias_keys))
+
+    output = [found.get(key) if key is not None else None for key in keys]
+    missing = [index for index, html in enumerate(output) if html is None]
+    if by_alias and metrics._callbacks:
+        cached = [key for key in keys if key is not None]
+        hits = sum(1 for key in cached if key in found)
+        metrics.emit('bricks.render.cache_hits', hits)
+        metrics.emit('bricks.render.cache_misses', len(cached) - hits)
+    if not missing:
+        return output
+    pending = {}
+    rendered = render([bricks[index] for index in missing])
+    for index, html in zip(missing, rendered):
+        output[index] = html
+        brick, key = bricks[index], keys[index]
+        if key is not None:
+            pending.setdefault((brick.cache_alias, brick.cache_timeout),
+                               []).append((brick, key, html))
+    for (alias, timeout), entries in pending.items():
+        _store(caches[alias], entries, timeout)
+    return output
+
+
+def invalidate_fragments(instance):
+    """Deletes the cached bricks holding the given model instance."""
+    index_key = _get_index_key(instance.__class__, instance.pk)
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        keys = cache.get(index_key)
+        if keys:
+            cache.delete_many(list(keys) + [index_key])
+
+
+def invalidate_fragments_receiver(sender, instance, **kwargs):
+    """Receiver of ``post_save`` and ``post_delete``."""
+    invalidate_fragments(instance)
+
+
+def connect_fragment_cache(*models):
+    """
+    Deletes the cached bricks holding an instance of the given models every
+    time it is saved or deleted.
+
+    Call it when the application is ready, in every process that saves them.
+    """
+    for model in models:
+        for name, signal in (('save', post_save), ('delete', post_delete)):
+            signal.connect(invalidate_fragments_receiver, sender=model,
+                           dispatch_uid='djangobricks_fragments_%s' % name)
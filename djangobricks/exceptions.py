@@ -1,3 +1,5 @@
 class BricksException(Exception): pass
 
 class TemplateNameNotFound(BricksException): pass
+
+class InvalidCursor(BricksException): pass
@@ -0,0 +1,105 @@
+"""
+Timings and counters of the walls and of the rendering.
+
+The library reports its metrics to the callbacks added with
+:func:`add_callback`, each one called with the name of the metric, its value
+and a dictionary of tags, for example::
+
+    add_callback(lambda name, value, tags: statsd.timing(name, value * 1000))
+
+Without callbacks, nothing is measured. The metrics are:
+
+``bricks.wall.build``
+    The seconds spent by :meth:`BaseWallFactory.build_wall`, tagged with the
+    ``factory`` class.
+``bricks.source.time``, ``bricks.source.bricks``
+    The seconds spent reading a queryset and building its bricks, and the
+    number of bricks, tagged with the ``brick`` class and the ``model``.
+    A :attr:`BaseWallFactory.presorted` wall reads its querysets only as it
+    is sliced, and does not report them.
+``bricks.source.queries``, ``bricks.source.query_time``
+    The number of queries of a queryset and the seconds they took, on
+    Django 2.0 and later. :meth:`BaseWallFactory.awall` reports them only
+    for factories reading the querysets in threads, since the asynchronous
+    querysets share a single thread.
+``bricks.criteria.time``, ``bricks.criteria.evaluations``
+    The seconds spent computing the criteria values to sort a wall, and
+    their number, tagged with the ``wall`` class.
+``bricks.wall.sort``
+    The seconds spent sorting a wall, tagged with the ``wall`` class.
+``bricks.wall.filter``, ``bricks.wall.filter.bricks``
+    The seconds spent testing the bricks of a filtered wall, and the number
+    of bricks tested, tagged with the ``wall`` class.
+``bricks.render``, ``bricks.render.bricks``
+    The seconds spent rendering the bricks with a template, and their
+    number, tagged with the ``template`` name.
+``bricks.render.cache_hits``, ``bricks.render.cache_misses``
+    The number of bricks found, or not, in the cache when rendering.
+"""
+from __future__ import unicode_literals
+
+import time
+from contextlib import contextmanager
+
+#: The function that reads the clock, in seconds.
+timer = getattr(time, 'perf_counter', time.time)
+
+_callbacks = []
+
+
+def add_callback(callback):
+    """
+    Adds a function receiving the ``name``, the ``value`` and the ``tags`` of
+    each metric.
+    """
+    if callback not in _callbacks:
+        _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    """Removes a function added with :func:`add_callback`."""
+    if callback in _callbacks:
+        _callbacks.remove(callback)
+
+
+def enabled():
+    """Returns whether any callback receives the metrics."""
+    return bool(_callbacks)
+
+
+def emit(name, value, **tags):
+    """Sends a metric to every callback."""
+    for callback in list(_callbacks):
+        callback(name, value, tags)
+
+
+@contextmanager
+def timed(name, **tags):
+    """
+    Context manager that sends the seconds spent in its block as the metric
+    ``name``, if any callback receives the metrics.
+    """
+    if not _callbacks:
+        yield
+        return
+    start = timer()
+    try:
+        yield
+    finally:
+        emit(name, timer() - start, **tags)
+
+
+class QueryCounter(object):
+    """Execute wrapper counting the queries of a connection and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = timer()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += timer() - start
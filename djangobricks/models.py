@@ -1,12 +1,19 @@
 from __future__ import unicode_literals
 
-import copy
-from operator import attrgetter
-from itertools import chain
+import hashlib
+import heapq
+import importlib
+from array import array
+from functools import cmp_to_key, reduce
+from operator import attrgetter, itemgetter, or_
+from itertools import chain, islice
 
 import six
 from six.moves import range
 
+from djangobricks import metrics
+from djangobricks.exceptions import InvalidCursor
+
 if six.PY3:
     def cmp(a, b):
         return (a > b) - (a < b)
@@ -14,10 +21,241 @@ if six.PY3:
 SORTING_ASC = 1
 SORTING_DESC = -1
 
+
+def _sort_decorated(decorated, orders):
+    """
+    Sorts in place a list of ``(key, brick)`` tuples, where ``key`` is a tuple
+    holding the value of each criterion and ``orders`` the matching sorting
+    orders.
+
+    When every criterion shares the same direction the keys are compared as
+    a whole, otherwise a stable sort is run once per criterion, starting from
+    the least significant one. In both cases bricks with equal keys keep
+    their original order, as they would with a comparison function.
+    """
+    if not orders:
+        return
+    descending = [order < 0 for order in orders]
+    if all(descending) or not any(descending):
+        decorated.sort(key=itemgetter(0), reverse=descending[0])
+        return
+    for index in reversed(range(len(orders))):
+        decorated.sort(key=lambda pair: pair[0][index],
+                       reverse=descending[index])
+
+
+_numpy = None
+
+
+def _import_numpy():
+    """Returns the ``numpy`` module, or ``None`` if it is not installed."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+_NUMERIC_TYPES = frozenset(six.integer_types + (float, bool))
+
+
+def _column_array(numpy, column, descending):
+    """
+    Returns an array that sorts in ascending order as the values of the
+    column would in the given direction, or ``None`` if they are not all
+    numbers that NumPy holds without losing precision.
+
+    Converting other types, like dates, costs as much as sorting in Python.
+    """
+    types = set(map(type, column))
+    if not types <= _NUMERIC_TYPES:
+        return None
+    values = numpy.array(column)
+    if (values.dtype.kind not in 'biuf' or
+            (values.dtype.kind == 'f' and float not in types)):
+        # Integers too large for 64 bits, or converted to floats
+        return None
+    if not descending:
+        return values
+    if values.dtype.kind == 'f':
+        return -values
+    if values.dtype.kind == 'b' or values.dtype.itemsize < 8:
+        return -values.astype(numpy.int64)
+    if values.dtype.kind == 'i' and values.min() > numpy.iinfo(numpy.int64).min:
+        return -values
+    # The negation would overflow, sort on the ranks instead
+    return -numpy.unique(values, return_inverse=True)[1].ravel()
+
+
+def _lexsort_decorated(decorated, orders):
+    """
+    Sorts in place a list of ``(key, brick)`` tuples as
+    :func:`_sort_decorated` does, with ``numpy.lexsort`` on the columns of
+    the keys.
+
+    Returns ``False``, leaving the list untouched, if NumPy is not installed
+    or a column holds values it cannot sort.
+    """
+    numpy = _import_numpy()
+    if numpy is None or not orders or not decorated:
+        return False
+    if not set(map(type, decorated[0][0])) <= _NUMERIC_TYPES:
+        # Spare the columns when the first key already rules them out
+        return False
+    columns = list(zip(*[key for key, _ in decorated]))
+    if len(columns) != len(orders):
+        return False
+    arrays = []
+    for column, order in zip(columns, orders):
+        values = _column_array(numpy, column, order < 0)
+        if values is None:
+            return False
+        arrays.append(values)
+    # The last array is the primary key, the sort is stable
+    indexes = numpy.lexsort(arrays[::-1]).tolist()
+    decorated[:] = [decorated[index] for index in indexes]
+    return True
+
+
+def _sort_large_decorated(decorated, orders, threshold):
+    """
+    Sorts in place a list of ``(key, brick)`` tuples with
+    :func:`_lexsort_decorated` if it holds at least ``threshold`` tuples,
+    or with :func:`_sort_decorated` otherwise or if the former fails.
+    """
+    if (threshold is None or len(decorated) < threshold or
+            not _lexsort_decorated(decorated, orders)):
+        _sort_decorated(decorated, orders)
+
+
+class _Reversed(object):
+    """Wraps a value so that it compares in reverse order."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _ascending_key(orders):
+    """
+    Returns a function that turns a tuple of criteria values into a key
+    that sorts in ascending order, whatever the direction of each criterion.
+    """
+    descending = [order < 0 for order in orders]
+    if not any(descending):
+        return tuple
+    if all(descending):
+        return _Reversed
+    reversed_indexes = [i for i, desc in enumerate(descending) if desc]
+    def key(values):
+        values = list(values)
+        for index in reversed_indexes:
+            values[index] = _Reversed(values[index])
+        return values
+    return key
+
+
+def _select_decorated(decorated, orders, count):
+    """
+    Returns the first ``count`` tuples of a list of ``(key, brick)`` tuples,
+    as :func:`_sort_decorated` would order them, without sorting the whole
+    list.
+    """
+    if not orders:
+        return decorated[:count]
+    descending = [order < 0 for order in orders]
+    if all(descending):
+        return heapq.nlargest(count, decorated, key=itemgetter(0))
+    if not any(descending):
+        return heapq.nsmallest(count, decorated, key=itemgetter(0))
+    to_key = _ascending_key(orders)
+    return heapq.nsmallest(count, decorated, key=lambda pair: to_key(pair[0]))
+
+
+def _bisect_right(keys, key, to_key):
+    """
+    Returns the position where ``key`` should be inserted in the sorted list
+    of ``keys``, after any equal key. ``to_key`` is a function returned by
+    :func:`_ascending_key`.
+    """
+    key = to_key(key)
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if key < to_key(keys[middle]):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def _merge_decorated(sources, orders):
+    """
+    Lazily merges iterables of ``(key, brick)`` tuples, each one already
+    ordered as :func:`_sort_decorated` would order it.
+
+    Equal keys are yielded in the order of their sources, so the result is
+    the same as sorting the concatenation of the sources.
+    """
+    to_key = _ascending_key(orders)
+    heap = []
+    for index, source in enumerate(sources):
+        source = iter(source)
+        for key, brick in source:
+            heap.append((to_key(key), index, key, brick, source))
+            break
+    heapq.heapify(heap)
+    while heap:
+        _, index, key, brick, source = heap[0]
+        yield key, brick
+        for key, brick in source:
+            heapq.heapreplace(heap, (to_key(key), index, key, brick, source))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+def _slice_stop(key):
+    """
+    Returns how many bricks from the top of a wall are needed to resolve
+    ``key``, or ``None`` if the whole wall is needed.
+    """
+    if isinstance(key, six.integer_types):
+        return key + 1 if key >= 0 else None
+    if isinstance(key, slice):
+        if (key.stop is None or key.stop < 0 or
+                (key.start is not None and key.start < 0) or
+                (key.step is not None and key.step < 0)):
+            return None
+        return key.stop
+    return None
+
+
 # ---------------------------------------------------------------------------
 # Criterion
 # ---------------------------------------------------------------------------
 
+_MISSING = object()
+
+
+def _overrides(cls, base, name):
+    """Returns whether ``cls`` overrides the method ``name`` of ``base``."""
+    return (six.get_unbound_function(getattr(cls, name)) is not
+            six.get_unbound_function(getattr(base, name)))
+
+
 class Criterion(object):
     """A criterion works as a sorting key for a :class:`BaseWall` subclass.
 
@@ -26,6 +264,8 @@ class Criterion(object):
 
     :param attrname: the name of the attribute to retrieve from an item of a
         :class:`SingleBrick`. Can be a callable that takes no argument.
+        Can also be a path through related objects and dictionary keys,
+        separated by ``__``, like ``thread__comment_count``.
 
     :param callback: a function that receives an item list and returns a
         single value for the ``attrname``, for example ``max``.
@@ -39,6 +279,18 @@ class Criterion(object):
         self.attrname = attrname
         self.callback = callback
         self.default = default
+        path = tuple(attrname.split('__'))
+        # Names like __str__ are not paths
+        self._path = path if len(path) > 1 and all(path) else None
+        # An attribute with the whole name, like the posts__count alias of
+        # an aggregate, is read before following the path
+        self._getter = attrgetter(attrname)
+        if self._path is not None and not hasattr(dict, path[-1]):
+            # Fails on the dictionaries along the path, but would return a
+            # method of the last one instead of the value of its key
+            self._path_getter = attrgetter('.'.join(path))
+        else:
+            self._path_getter = None
 
     def __repr__(self):
         return self.attrname
@@ -47,12 +299,84 @@ class Criterion(object):
         """
         Returns a value for an item or the :attr:`default` if the item doesn't have
         any attribute :attr:`attrname`.
+
+        If the item has no attribute :attr:`attrname` and the name is a path,
+        each part is a key of a dictionary or an attribute of any other
+        object, and the :attr:`default` is also returned when an object along
+        the path is missing or ``None``.
         """
-        attrvalue = getattr(item, self.attrname, self.default)
+        if self._path is None:
+            attrvalue = getattr(item, self.attrname, self.default)
+        else:
+            attrvalue = getattr(item, self.attrname, _MISSING)
+            if attrvalue is _MISSING:
+                attrvalue = self._follow_path(item)
         if callable(attrvalue):
             return attrvalue()
         return attrvalue
 
+    def _follow_path(self, item):
+        value = item
+        for name in self._path:
+            if value is None:
+                return self.default
+            if isinstance(value, dict):
+                value = value.get(name, _MISSING)
+            else:
+                # Also catches the missing reverse one-to-one relations
+                value = getattr(value, name, _MISSING)
+            if value is _MISSING:
+                return self.default
+        return value
+
+    def get_values(self, bricks):
+        """
+        Returns the list of the values for the given bricks, in the same
+        order, as :meth:`BaseBrick.get_cached_value_for_criterion` would
+        return them.
+
+        The bricks are grouped by class and each class gets the values of its
+        bricks all at once, see :meth:`BaseBrick.get_values_for_criterion`.
+        """
+        classes = set(map(type, bricks))
+        if len(classes) == 1:
+            return list(classes.pop().get_values_for_criterion(self, bricks))
+        groups = {}
+        for index, brick in enumerate(bricks):
+            groups.setdefault(type(brick), []).append(index)
+        values = [None] * len(bricks)
+        for brick_class, indexes in six.iteritems(groups):
+            group = brick_class.get_values_for_criterion(
+                self, [bricks[index] for index in indexes])
+            for index, value in zip(indexes, group):
+                values[index] = value
+        return values
+
+    def get_values_for_items(self, items):
+        """
+        Returns the list of the values for the given items, in the same order,
+        as :meth:`get_value_for_item` would return them.
+
+        The attributes are read by a single :func:`operator.attrgetter`,
+        falling back on :meth:`get_value_for_item` for the whole list when
+        one of them is missing.
+        """
+        if _overrides(self.__class__, Criterion, 'get_value_for_item'):
+            return [self.get_value_for_item(item) for item in items]
+        try:
+            values = list(map(self._getter, items))
+        except AttributeError:
+            if self._path_getter is None or any(
+                    hasattr(item, self.attrname) for item in items):
+                return [self.get_value_for_item(item) for item in items]
+            try:
+                values = list(map(self._path_getter, items))
+            except AttributeError:
+                return [self.get_value_for_item(item) for item in items]
+        if any(map(callable, values)):
+            values = [value() if callable(value) else value for value in values]
+        return values
+
     def get_value_for_list(self, items=()):
         """
         Returns a single value for a list of items, filtering the values for
@@ -60,7 +384,7 @@ class Criterion(object):
         If no :attr:`callback` is specified or if the item list is empty,
         it returns the :attr:`default` value.
         """
-        if not isinstance(items, (list, tuple)):
+        if not isinstance(items, (list, tuple, ItemSlice)):
             raise ValueError('List or tuple expected.')
         if items and self.callback is not None and callable(self.callback):
             # This is needed to avoid ValueError for some callback that can
@@ -68,37 +392,271 @@ class Criterion(object):
             return self.callback([self.get_value_for_item(i) for i in items])
         return callable(self.default) and self.default() or self.default
 
+    def get_value_for_values(self, values):
+        """
+        Returns a single value for the values already retrieved from a list of
+        items, for example by the database, in the same way as
+        :meth:`get_value_for_list`.
+        """
+        if values and self.callback is not None and callable(self.callback):
+            return self.callback(values)
+        return callable(self.default) and self.default() or self.default
+
+    def get_related_paths(self):
+        """
+        Returns the list of the relations traversed to get the value of an
+        item, that :class:`BaseWallFactory` fetches along with the objects.
+
+        By default, it is the :attr:`attrname` up to the last ``__``, if any.
+        """
+        if '__' not in self.attrname:
+            return []
+        return [self.attrname.rsplit('__', 1)[0]]
+
+
+class ExpressionCriterion(Criterion):
+    """A criterion whose value is computed by the database.
+
+    :class:`BaseWallFactory` annotates each queryset with the
+    :attr:`expression`, using :attr:`attrname` as the alias, so that the
+    value can be read, ordered by or sorted on like any other field.
+
+    :param attrname: the name of the annotation.
+
+    :param expression: a Django query expression, for example
+        ``Count('comments')`` or ``Coalesce('updated', 'created')``.
+
+    The other parameters are the same as :class:`Criterion`.
+    """
+
+    def __init__(self, attrname, expression, callback=None, default=None):
+        super(ExpressionCriterion, self).__init__(attrname, callback, default)
+        self.expression = expression
+
+    def get_related_paths(self):
+        # The relations are traversed by the database
+        return []
+
 
 # ---------------------------------------------------------------------------
 # Brick
 # ---------------------------------------------------------------------------
 
+def _model_label(model):
+    opts = model._meta
+    return '%s.%s' % (opts.app_label, opts.object_name)
+
+
+def _get_cache_key(brick, items, extra_context):
+    """
+    Returns the cache key of the given brick rendered with the given extra
+    context, built from its class, its template and its model instances.
+    """
+    version = brick.cache_version_attribute
+    parts = ['%s.%s' % (brick.__class__.__module__, brick.__class__.__name__),
+             brick.template_name]
+    for item in items:
+        value = getattr(item, version) if version else None
+        if callable(value):
+            value = value()
+        parts.append((_model_label(item.__class__), item.pk, value))
+    parts.extend(sorted((extra_context or {}).items()))
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return 'djangobricks:fragment:%s' % digest
+
+
+def _get_slots(cls):
+    """Returns the names of the slots of a class and its bases."""
+    try:
+        return _slots[cls]
+    except KeyError:
+        pass
+    names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, six.string_types):
+            slots = (slots,)
+        names.extend(name for name in slots
+                     if name not in ('__dict__', '__weakref__'))
+    _slots[cls] = names
+    return names
+
+_slots = {}
+
+
 class BaseBrick(object):
     """Base class for a brick.
 
     A brick is a container for a single Django model instance or a list of
     instances. Subclasses should extend one of the two provided subclasses
     that implement those two use cases.
+
+    The base classes of the bricks declare no attributes of their own with
+    ``__slots__``, so that :class:`SlottedSingleBrick` and
+    :class:`SlottedListBrick` can do without a ``__dict__``.
     """
+    __slots__ = ()
 
     template_name = None #: The name of the template file to render the brick.
+    #: If ``True``, the value of each criterion is computed only once and
+    #: kept by the brick until :meth:`invalidate_criteria` is called.
+    cache_criteria = False
+    #: The number of seconds the rendered brick is cached for by the
+    #: template tags, ``None`` to render it every time.
+    cache_timeout = None
+    #: The alias of the cache that keeps the rendered brick.
+    cache_alias = 'default'
+    #: The name of an attribute of the objects, for example their
+    #: modification date, whose value is part of the cache key.
+    cache_version_attribute = None
+    #: The relations to follow with ``select_related`` when reading the
+    #: objects of the brick, for example the ones used by its template.
+    select_related = ()
+    #: The relations to fetch with ``prefetch_related`` when reading the
+    #: objects of the brick.
+    prefetch_related = ()
+
+    def __getstate__(self):
+        obj_dict = dict(getattr(self, '__dict__', ()))
+        for name in _get_slots(self.__class__):
+            try:
+                obj_dict[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        # The cached values are keyed by criteria, that might not be pickable
+        obj_dict.pop('_criteria_cache', None)
+        return obj_dict
+
+    def __setstate__(self, state):
+        slots = _get_slots(self.__class__)
+        for name, value in state.items():
+            if name in slots:
+                object.__setattr__(self, name, value)
+            else:
+                self.__dict__[name] = value
 
     def get_value_for_criterion(self, criterion):
         """Returns the criterion value for this brick."""
         raise NotImplementedError
 
+    def get_cached_value_for_criterion(self, criterion):
+        """
+        Returns the criterion value for this brick, as computed by
+        :meth:`get_value_for_criterion`.
+
+        If :attr:`cache_criteria` is set, the value is computed just the
+        first time and reused by any wall sorting the brick afterwards, even
+        with different criteria. Walls always get values through this method.
+        """
+        if not self.cache_criteria:
+            return self.get_value_for_criterion(criterion)
+        try:
+            cache = self._criteria_cache
+        except AttributeError:
+            cache = self._criteria_cache = {}
+        try:
+            return cache[criterion]
+        except KeyError:
+            value = cache[criterion] = self.get_value_for_criterion(criterion)
+            return value
+
+    @classmethod
+    def get_values_for_criterion(cls, criterion, bricks):
+        """
+        Returns the list of the criterion values for the given bricks of this
+        class, in the same order, as :meth:`get_cached_value_for_criterion`
+        would return them.
+
+        Override it to get the values of many bricks at once, for example
+        with a single query.
+        """
+        return [brick.get_cached_value_for_criterion(criterion)
+                for brick in bricks]
+
+    def invalidate_criteria(self, *criteria):
+        """
+        Forgets the cached value of the given criteria, or of every
+        criterion if none is given.
+        """
+        cache = getattr(self, '_criteria_cache', None)
+        if not cache:
+            return
+        if not criteria:
+            cache.clear()
+        for criterion in criteria:
+            cache.pop(criterion, None)
+
     @classmethod
     def get_bricks_for_queryset(cls, queryset):
         """Returns a list of bricks from the given queryset."""
         raise NotImplementedError
 
+    @classmethod
+    def aget_bricks_for_queryset(cls, queryset):
+        """
+        Returns an awaitable list of bricks from the given queryset, read
+        without blocking the event loop. See
+        :func:`djangobricks.asynchronous.get_bricks_for_queryset`.
+
+        Requires Python 3.6.
+        """
+        from djangobricks.asynchronous import get_bricks_for_queryset
+        return get_bricks_for_queryset(cls, queryset)
+
+    @classmethod
+    def stream_bricks_for_queryset(cls, queryset, batch_size=100):
+        """
+        Returns an iterator over the bricks of the given queryset, that is
+        read in slices of ``batch_size`` rows as the iteration goes on.
+
+        The queryset should be ordered, otherwise the slices are not
+        guaranteed to be consistent with each other.
+        """
+        start = 0
+        while True:
+            # Slice a clone, an evaluated queryset would return a list. The
+            # slice is read once, its length must not run another query.
+            batch = list(queryset.all()[start:start + batch_size])
+            for brick in cls.get_bricks_for_queryset(batch):
+                yield brick
+            if len(batch) < batch_size:
+                break
+            start += batch_size
+
+    @classmethod
+    def get_deferred_bricks_for_queryset(cls, queryset, criteria, fields):
+        """
+        Returns an iterator over :class:`DeferredBrick` instances standing in
+        for the bricks of the given queryset, holding just the values of the
+        ``criteria`` read from the matching ``fields``.
+
+        Returns ``None`` if the class cannot defer its bricks, which is the
+        default.
+        """
+        return None
+
+    def get_cache_key(self, extra_context=None):
+        """
+        Returns the key the brick is cached with when rendered with the given
+        extra context, or ``None`` if it cannot be cached, which is the
+        default.
+
+        See :attr:`cache_timeout`.
+        """
+        return None
+
     def get_context(self, **kwargs):
         """Returns the context to be passed on to the template."""
         return {}
 
 
-class SingleBrick(BaseBrick):
-    """Brick for a single object."""
+class BaseSingleBrick(BaseBrick):
+    """
+    The methods of the bricks for a single object, shared by
+    :class:`SingleBrick` and :class:`SlottedSingleBrick`.
+    """
+    __slots__ = ()
+
     def __init__(self, item):
         self.item = item
 
@@ -108,6 +666,18 @@ class SingleBrick(BaseBrick):
     def get_value_for_criterion(self, criterion):
         return criterion.get_value_for_item(self.item)
 
+    @classmethod
+    def get_values_for_criterion(cls, criterion, bricks):
+        """
+        Returns the list of the criterion values for the given bricks, read
+        from their items by :meth:`Criterion.get_values_for_items`.
+        """
+        if cls.cache_criteria or _overrides(cls, BaseSingleBrick,
+                                            'get_value_for_criterion'):
+            return super(BaseSingleBrick, cls).get_values_for_criterion(
+                criterion, bricks)
+        return criterion.get_values_for_items([brick.item for brick in bricks])
+
     @classmethod
     def get_bricks_for_queryset(cls, queryset):
         """
@@ -116,6 +686,28 @@ class SingleBrick(BaseBrick):
         """
         return (cls(i) for i in queryset)
 
+    @classmethod
+    def get_deferred_bricks_for_queryset(cls, queryset, criteria, fields):
+        """
+        Returns an iterator over the deferred bricks, one for each row of
+        the primary key and the given ``fields`` of the queryset.
+        """
+        source = _DeferredSource(cls, queryset, criteria)
+        # Rows are not kept in the queryset cache, the bricks hold the values
+        rows = queryset.prefetch_related(None).values_list(
+            'pk', *fields).iterator()
+        return (DeferredBrick(source, row[0], row[1:]) for row in rows)
+
+    def get_cache_key(self, extra_context=None):
+        """
+        Returns a key built from the class, the template name, the model and
+        primary key of the item, the value of its
+        :attr:`cache_version_attribute` and the extra context.
+        """
+        if not hasattr(self.item, '_meta'):
+            return None
+        return _get_cache_key(self, [self.item], extra_context)
+
     def get_context(self, **kwargs):
         """
         Returns the context to be passed on to the template.
@@ -126,9 +718,100 @@ class SingleBrick(BaseBrick):
         return {'object': self.item}
 
 
-class ListBrick(BaseBrick):
-    """Brick for a list of objects."""
+class SingleBrick(BaseSingleBrick):
+    """Brick for a single object."""
+
+
+class SlottedSingleBrick(BaseSingleBrick):
+    """Brick for a single object, that takes less memory per brick.
+
+    Its instances have no ``__dict__``: a subclass that declares
+    ``__slots__``, with the names of its own attributes if any, can only set
+    those. It is not a subclass of :class:`SingleBrick`, check for
+    :class:`BaseSingleBrick` to accept both.
+    """
+    __slots__ = ('item', '_criteria_cache')
+
+
+class ItemSlice(object):
+    """A read-only view over a slice of a list, that does not copy it.
+
+    It is what the :attr:`ListBrick.items` are made of when
+    :attr:`ListBrick.share_items` is set.
+    """
+    __slots__ = ('items', 'start', 'stop')
+
+    def __init__(self, items, start, stop):
+        self.items = items
+        self.start = start
+        self.stop = min(stop, len(items))
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __len__(self):
+        return max(self.stop - self.start, 0)
+
+    def __iter__(self):
+        items = self.items
+        return (items[index] for index in range(self.start, self.stop))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.items[self.start + index]
+                    for index in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('Index out of range.')
+        return self.items[self.start + key]
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, ItemSlice)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+
+def _iter_queryset(queryset, chunk_size):
+    """
+    Returns an iterator over the objects of the queryset that does not fill
+    its result cache.
+
+    Querysets already evaluated or with related objects to prefetch, that
+    ``iterator()`` would ignore, are just iterated.
+    """
+    if (getattr(queryset, '_result_cache', None) is not None or
+            getattr(queryset, '_prefetch_related_lookups', None) or
+            not hasattr(queryset, 'iterator')):
+        return iter(queryset)
+    try:
+        return queryset.iterator(chunk_size=chunk_size)
+    except TypeError:
+        # Django < 2.0
+        return queryset.iterator()
+
+
+class BaseListBrick(BaseBrick):
+    """
+    The methods of the bricks for a list of objects, shared by
+    :class:`ListBrick` and :class:`SlottedListBrick`.
+    """
+    __slots__ = ()
+
     chunk_size = 5 #: The default length of a list.
+    #: The number of rows fetched from the database at a time when reading a
+    #: queryset with :meth:`iter_bricks_for_queryset`.
+    iterator_chunk_size = 2000
+    #: If ``True``, the bricks hold an :class:`ItemSlice` over a list of
+    #: all the objects, shared with each other, instead of their own list.
+    #: The results of an evaluated queryset are shared as they are.
+    share_items = False
 
     def __init__(self, items):
         self.items = items
@@ -145,11 +828,76 @@ class ListBrick(BaseBrick):
         Returns a list of bricks, each one containing :attr:`chunk_size`
         elements.
         """
-        count = queryset.count()
-        # Execute the query once to avoid several OFFSET LIMIT
-        items = list(queryset)
-        return [cls(i) for i in (items[i:i+cls.chunk_size]
-                                 for i in range(0, count, cls.chunk_size))]
+        return list(cls.iter_bricks_for_queryset(queryset))
+
+    @classmethod
+    def iter_bricks_for_queryset(cls, queryset):
+        """
+        Returns an iterator over the bricks of the queryset, each one
+        containing :attr:`chunk_size` elements.
+
+        The queryset is read in a single query, as the iteration goes on, and
+        each object is kept only by its brick.
+        """
+        size = cls.chunk_size
+        objects = _iter_queryset(queryset, cls.iterator_chunk_size)
+        if not cls.share_items:
+            return cls._iter_chunks(objects)
+        items = queryset if isinstance(queryset, list) else getattr(
+            queryset, '_result_cache', None)
+        if items is None:
+            items = list(objects)
+        return (cls(ItemSlice(items, start, start + size))
+                for start in range(0, len(items), size))
+
+    @classmethod
+    def _iter_chunks(cls, objects):
+        while True:
+            items = list(islice(objects, cls.chunk_size))
+            if not items:
+                break
+            yield cls(items)
+
+    @classmethod
+    def stream_bricks_for_queryset(cls, queryset, batch_size=100):
+        """
+        Same as :meth:`BaseBrick.stream_bricks_for_queryset`, but the
+        ``batch_size`` is rounded up to a multiple of :attr:`chunk_size`
+        so that no list spans two slices.
+        """
+        batch_size = -(-batch_size // cls.chunk_size) * cls.chunk_size
+        return super(BaseListBrick, cls).stream_bricks_for_queryset(queryset,
+                                                                batch_size)
+
+    @classmethod
+    def get_deferred_bricks_for_queryset(cls, queryset, criteria, fields):
+        """
+        Returns an iterator over the deferred bricks, each one holding the
+        primary keys of :attr:`chunk_size` rows and the criteria values
+        computed by :meth:`Criterion.get_value_for_values` on the given
+        ``fields`` of those rows.
+        """
+        source = _DeferredSource(cls, queryset, criteria)
+        rows = queryset.prefetch_related(None).values_list(
+            'pk', *fields).iterator()
+        while True:
+            chunk = list(islice(rows, cls.chunk_size))
+            if not chunk:
+                break
+            columns = list(zip(*chunk))
+            values = tuple(criterion.get_value_for_values(list(column))
+                           for (criterion, _), column
+                           in zip(criteria, columns[1:]))
+            yield DeferredListBrick(source, list(columns[0]), values)
+
+    def get_cache_key(self, extra_context=None):
+        """
+        Same as :meth:`SingleBrick.get_cache_key`, for each item of the
+        list.
+        """
+        if not all(hasattr(item, '_meta') for item in self.items):
+            return None
+        return _get_cache_key(self, self.items, extra_context)
 
     def get_context(self, **kwargs):
         """
@@ -161,6 +909,254 @@ class ListBrick(BaseBrick):
         return {'object_list': self.items}
 
 
+class ListBrick(BaseListBrick):
+    """Brick for a list of objects."""
+
+
+class SlottedListBrick(BaseListBrick):
+    """Brick for a list of objects, that takes less memory per brick.
+
+    Same as :class:`SlottedSingleBrick`, it is not a subclass of
+    :class:`ListBrick`, check for :class:`BaseListBrick` to accept both.
+    """
+    __slots__ = ('items', '_criteria_cache')
+
+
+class _DeferredSource(object):
+    """The brick class and the queryset shared by some deferred bricks."""
+
+    def __init__(self, brick_class, queryset, criteria):
+        self.brick_class = brick_class
+        self.queryset = queryset
+        self.positions = dict((criterion, index) for index, (criterion, _)
+                              in enumerate(criteria))
+
+    def __getstate__(self):
+        # Pickling a queryset would evaluate it and the criteria might not
+        # be pickable. The query keeps the annotations and the relations to
+        # select, the related lookups are kept aside.
+        return {'brick_class': self.brick_class, 'model': self.queryset.model,
+                'query': self.queryset.query,
+                'prefetch': self.queryset._prefetch_related_lookups}
+
+    def __setstate__(self, state):
+        self.brick_class = state['brick_class']
+        self.queryset = state['model']._default_manager.all()
+        if state.get('query') is not None:
+            self.queryset.query = state['query']
+        if state.get('prefetch'):
+            self.queryset = self.queryset.prefetch_related(*state['prefetch'])
+        self.positions = {}
+
+    def load(self, bricks):
+        """Loads the objects of the given deferred bricks in one query."""
+        pks = set(chain.from_iterable(brick.get_pks() for brick in bricks))
+        # The content is often sliced, the primary keys come from the slice
+        queryset = self.queryset.all()
+        queryset.query.clear_limits()
+        objects = queryset.in_bulk(list(pks))
+        for brick in bricks:
+            brick.brick = brick.build(objects)
+            brick.loaded = True
+
+
+class DeferredBrick(BaseBrick):
+    """Stand-in for a brick whose object has not been loaded yet.
+
+    It holds the primary key of the object and the values of the criteria of
+    the wall, that is all a wall needs to be sorted. The wall loads the
+    actual bricks in bulk, one query per queryset, only for the bricks that
+    are sliced or iterated.
+
+    See :attr:`BaseWallFactory.deferred`.
+    """
+    __slots__ = ('source', 'pk', 'values', 'brick', 'loaded',
+                 '_criteria_cache')
+
+    def __init__(self, source, pk, values):
+        self.source = source
+        self.pk = pk
+        self.values = values
+        self.brick = None #: The actual brick, once loaded.
+        self.loaded = False
+
+    def __repr__(self):
+        return '<%s: %s %r>' % (self.__class__.__name__,
+                                self.source.brick_class.__name__, self.pk)
+
+    @property
+    def template_name(self):
+        return self.source.brick_class.template_name
+
+    @property
+    def cache_timeout(self):
+        return self.source.brick_class.cache_timeout
+
+    @property
+    def cache_alias(self):
+        return self.source.brick_class.cache_alias
+
+    def get_value_for_criterion(self, criterion):
+        try:
+            return self.values[self.source.positions[criterion]]
+        except KeyError:
+            return self.get_brick().get_value_for_criterion(criterion)
+
+    def get_pks(self):
+        """Returns the primary keys of the objects of the brick."""
+        return [self.pk]
+
+    def build(self, objects):
+        """
+        Returns the actual brick given a dictionary of the loaded objects by
+        primary key, or ``None`` if its object no longer exists.
+        """
+        item = objects.get(self.pk)
+        if item is None:
+            return None
+        return self.source.brick_class(item)
+
+    def get_brick(self):
+        """
+        Returns the actual brick, loading it if needed.
+
+        Raises ``DoesNotExist`` if its object no longer exists.
+        """
+        if not self.loaded:
+            self.source.load([self])
+        if self.brick is None:
+            raise self.source.queryset.model.DoesNotExist(
+                '%r no longer exists.' % self)
+        return self.brick
+
+    def get_cache_key(self, extra_context=None):
+        return self.get_brick().get_cache_key(extra_context)
+
+    def get_context(self, **kwargs):
+        return self.get_brick().get_context(**kwargs)
+
+
+def _get_brick_class(brick):
+    """Returns the class of a brick, or of the brick a deferred one stands
+    in for."""
+    if isinstance(brick, DeferredBrick):
+        return brick.source.brick_class
+    return brick.__class__
+
+
+class DeferredListBrick(DeferredBrick):
+    """Stand-in for a :class:`ListBrick` whose objects have not been loaded
+    yet. It holds the list of their primary keys as :attr:`pks`.
+    """
+    __slots__ = ('pks',)
+
+    def __init__(self, source, pks, values):
+        super(DeferredListBrick, self).__init__(source, None, values)
+        self.pks = pks
+
+    def __repr__(self):
+        return '<%s: %s %r>' % (self.__class__.__name__,
+                                self.source.brick_class.__name__, self.pks)
+
+    def get_pks(self):
+        return self.pks
+
+    def build(self, objects):
+        items = [objects[pk] for pk in self.pks if pk in objects]
+        if not items:
+            return None
+        return self.source.brick_class(items)
+
+
+def _load_deferred(bricks):
+    """
+    Returns the given bricks replacing the deferred ones with the actual
+    bricks, loaded in bulk. Bricks whose object no longer exists are left out.
+    """
+    pending = {}
+    for brick in bricks:
+        if isinstance(brick, DeferredBrick) and not brick.loaded:
+            pending.setdefault(brick.source, []).append(brick)
+    for source, deferred in pending.items():
+        source.load(deferred)
+    return [brick.brick if isinstance(brick, DeferredBrick) else brick
+            for brick in bricks
+            if not isinstance(brick, DeferredBrick) or brick.brick is not None]
+
+
+def _compact_brick(brick):
+    """
+    Returns the brick class, the model and the primary key (or the list of
+    primary keys) of the given brick, or ``None`` if it holds no model
+    instances.
+    """
+    if isinstance(brick, DeferredBrick):
+        source = brick.source
+        pks = brick.pks if isinstance(brick, DeferredListBrick) else brick.pk
+        return source.brick_class, source.queryset.model, pks
+    if isinstance(brick, BaseSingleBrick) and hasattr(brick.item, '_meta'):
+        return brick.__class__, brick.item.__class__, brick.item.pk
+    if (isinstance(brick, BaseListBrick) and brick.items and
+            hasattr(brick.items[0], '_meta')):
+        return (brick.__class__, brick.items[0].__class__,
+                [item.pk for item in brick.items])
+    return None
+
+
+def _dump_compact(bricks):
+    """
+    Returns the list of ``(brick class path, model label, deferred source)``
+    tuples of the given bricks and a list with a ``(tuple index, pk or pks)``
+    row for each brick. Bricks without model instances are kept as they are
+    in the row, with ``None`` as index. The source of deferred bricks is kept
+    along, so that their objects are loaded back with the same queryset.
+    """
+    sources = {}
+    rows = []
+    for brick in bricks:
+        compact = _compact_brick(brick)
+        if compact is None:
+            rows.append((None, brick))
+            continue
+        brick_class, model, pks = compact
+        deferred = brick.source if isinstance(brick, DeferredBrick) else None
+        source = ('%s.%s' % (brick_class.__module__, brick_class.__name__),
+                  _model_label(model), deferred)
+        index = sources.setdefault(source, len(sources))
+        rows.append((index, pks))
+    return sorted(sources, key=sources.get), rows
+
+
+def _load_compact(sources, rows):
+    """
+    Returns the deferred bricks standing in for the rows dumped by
+    :func:`_dump_compact` and their sources. No query is run until the bricks
+    are loaded.
+    """
+    from django.apps import apps
+    deferred_sources = []
+    for source in sources:
+        # Walls pickled by previous versions have no deferred source
+        brick_path, model_label = source[:2]
+        if len(source) > 2 and source[2] is not None:
+            deferred_sources.append(source[2])
+            continue
+        module_name, class_name = brick_path.rsplit('.', 1)
+        brick_class = getattr(importlib.import_module(module_name), class_name)
+        model = apps.get_model(model_label)
+        deferred_sources.append(
+            _DeferredSource(brick_class, model._default_manager.all(), ()))
+    bricks = []
+    for index, pks in rows:
+        if index is None:
+            bricks.append(pks)
+        elif isinstance(pks, list):
+            bricks.append(DeferredListBrick(deferred_sources[index], pks, ()))
+        else:
+            bricks.append(DeferredBrick(deferred_sources[index], pks, ()))
+    return bricks, deferred_sources
+
+
 # ---------------------------------------------------------------------------
 # Brick Manager
 # ---------------------------------------------------------------------------
@@ -175,31 +1171,221 @@ class BaseWall(object):
     :param criteria: the list of criteria to sort the bricks by.
     """
 
+    #: If ``True``, the wall is pickled as the class and the primary keys of
+    #: each brick, along with its sort key, instead of the bricks themselves.
+    #: The unpickled wall loads the objects in bulk, only when needed, and
+    #: builds the bricks calling their class with the loaded objects.
+    compact_pickle = False
+    #: The number of bricks from which the wall is sorted with
+    #: ``numpy.lexsort``, if NumPy is installed and every criterion value is
+    #: a number, or ``None`` to always sort in Python.
+    lexsort_threshold = None
+    #: The names of the attributes, or the criteria, whose values are indexed
+    #: by :meth:`filter_by`. Their indexes are built before the wall is
+    #: pickled, the others only when first needed and then pickled along.
+    indexes = ()
+
     def __init__(self, bricks, criteria=None):
         self.bricks = bricks
         self.criteria = criteria or []
-        self._sorted = []
+        self._sorted = None
+        self._keys = None
+        self._decorated = None
+        self._head = []
+        self._stream = None
+        self._deferred = False
+        self._indexes = None
+        self._pending = None
+
+    @classmethod
+    def merged(cls, sources, criteria=None):
+        """
+        Returns a wall that lazily merges the bricks of the given sources,
+        each one an iterable of bricks already sorted by the criteria.
+
+        The sources are read only as far as the wall is sliced or iterated,
+        and the resulting order is the same as sorting all of their bricks.
+        """
+        wall = cls([], criteria)
+        if _overrides(cls, BaseWall, '_cmp'):
+            # The order of the sources is unknown to a comparison function
+            wall.bricks = list(chain.from_iterable(sources))
+            return wall
+        decorated = [((wall.get_sort_key(brick), brick) for brick in source)
+                     for source in sources]
+        wall._stream = _merge_decorated(decorated, wall._get_orders())
+        return wall
 
     def __getitem__(self, key):
-        return self.sorted[key]
+        if self._sorted is None:
+            stop = _slice_stop(key)
+            if stop is not None:
+                return self._load(self._get_head(stop)[key])
+        return self._load(self.sorted[key])
 
     def __iter__(self):
-        return iter(self.sorted)
+        if self._sorted is not None or not (self._head or
+                                            self._stream is not None):
+            iterator = iter(self.sorted)
+        else:
+            iterator = self._iter_from_head()
+        if self._deferred:
+            return self._iter_loaded(iterator)
+        return iterator
+
+    def _load(self, bricks):
+        """
+        Loads the actual bricks of a deferred wall, given a brick or a list
+        of bricks.
+        """
+        if not self._deferred:
+            return bricks
+        if isinstance(bricks, list):
+            return _load_deferred(bricks)
+        if isinstance(bricks, DeferredBrick):
+            return bricks.get_brick()
+        return bricks
+
+    def _iter_loaded(self, iterator, batch_size=100):
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            for brick in _load_deferred(batch):
+                yield brick
+
+    def _iter_from_head(self):
+        # Serve the bricks that are already in order and sort (or read)
+        # the rest only if the caller keeps iterating.
+        position = 0
+        while True:
+            if position >= len(self._head):
+                if self._stream is None:
+                    break
+                self._read_stream(position + 1)
+                continue
+            yield self._head[position]
+            position += 1
+        for brick in self.sorted[position:]:
+            yield brick
 
     def __len__(self):
+        if self._stream is not None:
+            # The bricks of a merged wall are known only once read
+            self._read_stream()
+        if not isinstance(self.bricks, list):
+            # The bricks of a filtered wall are known only once filtered
+            self.bricks = list(self.bricks)
         return len(self.bricks)
 
+    def __bool__(self):
+        if self._stream is not None:
+            # Read a merged or filtered wall only as far as its first brick
+            return bool(self._get_head(1))
+        return len(self) > 0
+
+    __nonzero__ = __bool__
+
     def __getstate__(self):
         # We save the sorted bricks and delete che criteria
-        # as those might not be pickable
+        # as those might not be pickable. Merged and filtered walls read
+        # their bricks only once sorted
+        bricks = self.sorted
+        for index in self.indexes:
+            self._get_index(getattr(index, 'attrname', index))
         obj_dict = self.__dict__.copy()
-        obj_dict['_sorted'] = self.sorted
+        obj_dict['_sorted'] = obj_dict['bricks'] = bricks
+        obj_dict['_decorated'] = None
+        obj_dict['_head'] = []
+        obj_dict['_stream'] = None
+        obj_dict['_pending'] = None
+        obj_dict.pop('_sources', None)
         if 'criteria' in obj_dict:
             del obj_dict['criteria']
+        if self.compact_pickle:
+            keys = self._keys
+            if keys is None and self._get_criteria():
+                keys = [self.get_sort_key(brick) for brick in self._sorted]
+            obj_dict['_compact'] = _dump_compact(self._sorted) + (keys,)
+            del obj_dict['_sorted'], obj_dict['bricks'], obj_dict['_keys']
         return obj_dict
 
+    def __setstate__(self, state):
+        # Walls pickled by previous versions lack the newer attributes
+        self.__dict__.update(_keys=None, _decorated=None, _head=[],
+                             _stream=None, _deferred=False, _indexes=None,
+                             _pending=None)
+        compact = state.pop('_compact', None)
+        self.__dict__.update(state)
+        if compact is not None:
+            sources, rows, keys = compact
+            self._sorted, self._sources = _load_compact(sources, rows)
+            self.bricks = self._sorted
+            self._keys = keys
+            self._deferred = True
+
+    def _get_criteria(self):
+        # Copies and unpickled walls do not carry the criteria along
+        return getattr(self, 'criteria', None) or ()
+
+    def get_sort_key(self, brick):
+        """
+        Returns a tuple with the value of each criterion for the given brick,
+        in the same order as :attr:`criteria`.
+        """
+        return tuple(brick.get_cached_value_for_criterion(criterion)
+                     for criterion, _ in self._get_criteria())
+
+    def _get_orders(self):
+        return [order for _, order in self._get_criteria()]
+
+    def _decorate(self):
+        """
+        Returns the list of ``(key, brick)`` tuples for the unsorted bricks.
+
+        The criteria values are extracted just once for each brick instead
+        of being computed again on every comparison.
+        """
+        if self._decorated is None:
+            if not isinstance(self.bricks, list):
+                # An iterator could not be read again after an invalidation
+                self.bricks = list(self.bricks)
+            criteria = self._get_criteria()
+            start = metrics.timer() if metrics._callbacks else None
+            if criteria and not _overrides(self.__class__, BaseWall,
+                                           'get_sort_key'):
+                # One column per criterion, with a single call each
+                columns = [criterion.get_values(self.bricks)
+                           for criterion, _ in criteria]
+                self._decorated = list(zip(zip(*columns), self.bricks))
+            else:
+                self._decorated = [(self.get_sort_key(brick), brick)
+                                   for brick in self.bricks]
+            if start is not None:
+                tags = {'wall': self.__class__.__name__}
+                metrics.emit('bricks.criteria.time', metrics.timer() - start,
+                             **tags)
+                metrics.emit('bricks.criteria.evaluations',
+                             len(self.bricks) * len(criteria), **tags)
+        return self._decorated
+
+    def _sort(self, decorated):
+        """Sorts in place a list of ``(key, brick)`` tuples."""
+        if _overrides(self.__class__, BaseWall, '_cmp'):
+            decorated.sort(key=cmp_to_key(
+                lambda left, right: self._cmp(left[1], right[1])))
+            return
+        _sort_large_decorated(decorated, self._get_orders(),
+                              self.lexsort_threshold)
+
     def _cmp(self, left, right):
         """
+        Comparison function equivalent to the ordering of :attr:`sorted`.
+
+        The bricks are sorted by their keys, unless a subclass overrides this
+        method: then they are sorted with it, more slowly, by :attr:`sorted`,
+        :meth:`add` and slicing.
+
         # Courtesy of:
         # http://stackoverflow.com/questions/1143671/python-sorting-list-of-dictionaries-by-multiple-keys
         """
@@ -216,16 +1402,172 @@ class BaseWall(object):
         """
         Lazy property that returns the list of bricks sorted by the criteria.
         """
-        if not self._sorted:
-            try:
-                # Python > 2.6
-                from functools import cmp_to_key
-                self._sorted = sorted(self.bricks, key=cmp_to_key(self._cmp))
-            except ImportError:
-                # Python <= 2.6
-                self._sorted = sorted(self.bricks, cmp=self._cmp)
+        if self._stream is not None:
+            self._read_stream()
+        if self._sorted is None:
+            decorated = list(self._decorate())
+            start = metrics.timer() if metrics._callbacks else None
+            self._sort(decorated)
+            if start is not None:
+                metrics.emit('bricks.wall.sort', metrics.timer() - start,
+                             wall=self.__class__.__name__)
+            self._sorted = [brick for _, brick in decorated]
+            # Keep the keys in order to insert new bricks with add()
+            self._keys = [key for key, _ in decorated]
+            self._decorated = None
+            self._head = []
+            self._indexes = None
         return self._sorted
 
+    def invalidate(self):
+        """
+        Forgets the order of the bricks, so that they are sorted again the
+        next time the wall is sliced or iterated.
+
+        Call it after changing the list of bricks. Bricks that cache their
+        values must be invalidated on their own, see
+        :meth:`BaseBrick.invalidate_criteria`.
+        """
+        if self._stream is not None:
+            self._read_stream()
+        self._sorted = None
+        self._keys = None
+        self._decorated = None
+        self._head = []
+        self._indexes = None
+        # A changed filtered wall is no longer filtered along with the next
+        self._pending = None
+
+    def set_criteria(self, criteria):
+        """Replaces the criteria of the wall and invalidates its order."""
+        self.criteria = criteria or []
+        self.invalidate()
+
+    def add(self, bricks):
+        """
+        Adds the given bricks to the wall.
+
+        If the wall is already sorted, each brick is inserted in place with a
+        binary search over the keys of the sorted bricks, instead of sorting
+        the wall again. Bricks with the same key as others go after them, as
+        if they were appended to the list of bricks before sorting.
+        """
+        bricks = list(bricks)
+        if self._stream is not None:
+            self._read_stream()
+        if self._sorted is None:
+            self.bricks = list(self.bricks)
+            self.bricks.extend(bricks)
+            if self._decorated is not None:
+                self._decorated.extend((self.get_sort_key(brick), brick)
+                                       for brick in bricks)
+            self._head = []
+            return
+        if self._keys is None:
+            self._keys = [self.get_sort_key(brick) for brick in self._sorted]
+        compare = _overrides(self.__class__, BaseWall, '_cmp')
+        if compare:
+            to_key = cmp_to_key(self._cmp)
+        else:
+            to_key = _ascending_key(self._get_orders())
+        for brick in bricks:
+            key = self.get_sort_key(brick)
+            if compare:
+                index = _bisect_right(self._sorted, brick, to_key)
+            else:
+                index = _bisect_right(self._keys, key, to_key)
+            self._keys.insert(index, key)
+            self._sorted.insert(index, brick)
+        # This will keep __len__ value consistent
+        self.bricks = self._sorted
+        self._indexes = None
+
+    def remove(self, predicate):
+        """
+        Removes from the wall the bricks for which the given ``predicate``
+        function returns ``True``, keeping the others in order.
+        """
+        if self._stream is not None:
+            self._read_stream()
+        if self._sorted is None:
+            if self._decorated is not None:
+                self._decorated = [pair for pair in self._decorated
+                                   if not predicate(pair[1])]
+                self.bricks = [brick for _, brick in self._decorated]
+            else:
+                self.bricks = [brick for brick in self.bricks
+                               if not predicate(brick)]
+            self._head = []
+            return
+        kept = [index for index, brick in enumerate(self._sorted)
+                if not predicate(brick)]
+        self._sorted = [self._sorted[index] for index in kept]
+        if self._keys is not None:
+            self._keys = [self._keys[index] for index in kept]
+        # This will keep __len__ value consistent
+        self.bricks = self._sorted
+        self._indexes = None
+
+    def head(self, count):
+        """
+        Returns a list with the first ``count`` bricks of the wall.
+
+        Unless the wall is already sorted, a partial sort selects just those
+        bricks, with the same order a full sort would give them, ties
+        included. Slicing the wall uses this method automatically.
+        """
+        return self._load(self._get_head(count))
+
+    def _get_head(self, count):
+        if self._stream is not None:
+            self._read_stream(count)
+        if self._sorted is not None:
+            return self._sorted[:count]
+        if count <= len(self._head):
+            return self._head[:count]
+        decorated = self._decorate()
+        if (count >= len(decorated) or
+                _overrides(self.__class__, BaseWall, '_cmp')):
+            return self.sorted[:count]
+        start = metrics.timer() if metrics._callbacks else None
+        selected = _select_decorated(decorated, self._get_orders(), count)
+        if start is not None:
+            metrics.emit('bricks.wall.sort', metrics.timer() - start,
+                         wall=self.__class__.__name__)
+        self._head = [brick for _, brick in selected]
+        return list(self._head)
+
+    def _read_stream(self, count=None):
+        """
+        Reads the bricks of a merged wall until the first ``count`` are
+        available or, if ``count`` is ``None``, until the sources are
+        exhausted.
+        """
+        head = self._head
+        if count is not None and len(head) >= count:
+            return
+        for _, brick in self._stream:
+            head.append(brick)
+            if count is not None and len(head) >= count:
+                return
+        self._stream = None
+        self._sorted = self.bricks = head
+        self._head = []
+        self._indexes = None
+
+    def _copy(self):
+        """
+        Returns a shallow copy of the wall for :meth:`filter`, without going
+        through :meth:`__getstate__`, that would build the indexes and the
+        compact state of the bricks.
+        """
+        obj = self.__class__.__new__(self.__class__)
+        obj.__dict__.update(self.__dict__)
+        obj.criteria = self._get_criteria()
+        obj.__dict__.update(_decorated=None, _head=[], _stream=None,
+                            _indexes=None, _pending=None)
+        return obj
+
     def filter(self, callback, operator='AND'):
         """
         Returns a copy of the wall where the bricks have been filtered using
@@ -238,25 +1580,420 @@ class BaseWall(object):
         This behaviour can be changed by setting the :attr:`operator` parameter
         to ``OR``, in which case as soon as callback returns ``True`` the brick
         is accepted.
+
+        The bricks are filtered lazily, when the copy is first sliced or
+        iterated. If this wall is not sorted yet, they are filtered before
+        sorting, so that only the accepted ones are sorted; otherwise the
+        sorted bricks are filtered just as far as the copy is sliced.
+        Filtering a copy that has not been read yet tests the bricks of this
+        wall against both filters in a single pass.
         """
         assert operator in ('OR', 'AND'), "Only 'AND' or 'OR' operators are supported"
         if not isinstance(callback, (list, tuple)):
             callback = [callback]
-        # The order of bricks is the same even when filtered.
-        # So we let the class to sort them (if they are not already) and then
-        # apply the filter.
-        obj = copy.copy(self)
+        callbacks = list(callback)
         func = all if operator == 'AND' else any
-        obj._sorted = [i for i in self if func(c(i) for c in callback)]
+
+        def predicate(brick):
+            return func(c(brick) for c in callbacks)
+        if self._pending is not None:
+            source, predicates = self._pending
+            return self._filtered(predicates + [predicate], source)
+        return self._filtered([predicate])
+
+    def _filtered(self, predicates, source=None):
+        """
+        Returns a copy of the wall with the bricks of ``source``, by default
+        this wall, that pass every predicate, to be filtered when first
+        needed.
+        """
+        if source is None:
+            source = self
+        if len(predicates) == 1:
+            accept = predicates[0]
+        else:
+            def accept(brick):
+                return all(predicate(brick) for predicate in predicates)
+        obj = self._copy()
+        obj._sorted = None
+        obj._keys = None
+        obj._pending = (source, predicates)
+        if source._sorted is not None and not source._deferred:
+            # The bricks are in order already, filter a snapshot of them
+            obj.bricks = []
+            obj._stream = obj._filter_stream(list(source._sorted), accept)
+        elif (source._sorted is not None or source._stream is not None or
+                source._deferred):
+            # The bricks come in order, and loaded, by iterating the wall
+            obj.bricks = []
+            obj._stream = obj._filter_stream(source, accept)
+        else:
+            if not isinstance(source.bricks, list):
+                source.bricks = list(source.bricks)
+            obj.bricks = obj._filter_bricks(source.bricks, accept)
+        return obj
+
+    def _filter_stream(self, bricks, accept):
+        # Yields (key, brick) tuples, see _read_stream()
+        if metrics._callbacks:
+            for brick in self._filter_bricks(bricks, accept):
+                yield None, brick
+            return
+        self._pending = None
+        for brick in bricks:
+            if accept(brick):
+                yield None, brick
+
+    def _filter_bricks(self, bricks, accept):
+        self._pending = None
+        if not metrics._callbacks:
+            for brick in bricks:
+                if accept(brick):
+                    yield brick
+            return
+        timer, elapsed, count = metrics.timer, 0.0, 0
+        try:
+            for brick in bricks:
+                start = timer()
+                accepted = accept(brick)
+                elapsed += timer() - start
+                count += 1
+                if accepted:
+                    yield brick
+        finally:
+            # Also when a slice stops reading the bricks early
+            tags = {'wall': self.__class__.__name__}
+            metrics.emit('bricks.wall.filter', elapsed, **tags)
+            metrics.emit('bricks.wall.filter.bricks', count, **tags)
+
+    def filter_by(self, brick_class=None, **values):
+        """
+        Returns a copy of the wall with just the bricks of the given
+        :attr:`brick_class`, or tuple of classes, subclasses included, and
+        whose attributes have the given values, like ``is_sticky=True``.
+
+        Instead of testing every brick, the positions of the matching bricks
+        are looked up in indexes, built once per wall and attribute. An
+        attribute is read as a :class:`Criterion` with its name, unless a
+        criterion with that name is declared in :attr:`indexes`. Since a list
+        brick has no single value for an attribute, a wall of list bricks can
+        only be filtered by the criteria declared in :attr:`indexes`, or a
+        ``ValueError`` is raised.
+        """
+        positions = None
+        if brick_class is not None:
+            classes = brick_class if isinstance(brick_class, tuple) else (
+                brick_class,)
+            index = self._get_index('brick_class')
+            found = [index[cls] for cls in index if issubclass(cls, classes)]
+            positions = (found[0] if len(found) == 1 else
+                         sorted(chain.from_iterable(found)))
+        for name, value in six.iteritems(values):
+            found = self._get_index(name).get(value, ())
+            if positions is None:
+                positions = found
+            else:
+                found = set(found)
+                positions = [position for position in positions
+                             if position in found]
+        bricks = self.sorted
+        if positions is None:
+            positions = range(len(bricks))
+        obj = self._copy()
+        obj._sorted = [bricks[position] for position in positions]
+        if self._keys is not None:
+            obj._keys = [self._keys[position] for position in positions]
         # This will keep __len__ value consistent
         obj.bricks = obj._sorted
         return obj
 
+    def _get_index(self, name):
+        """
+        Returns a dictionary of the positions of the sorted bricks, as
+        arrays, by class if ``name`` is ``'brick_class'`` or by the value of
+        the attribute ``name`` otherwise.
+        """
+        bricks = self.sorted
+        if self._indexes is None:
+            self._indexes = {}
+        index = self._indexes.get(name)
+        if index is None:
+            if name == 'brick_class':
+                keys = [_get_brick_class(brick) for brick in bricks]
+            else:
+                keys = self._get_index_values(
+                    self._get_index_criterion(name), bricks)
+            index = {}
+            for position, key in enumerate(keys):
+                positions = index.get(key)
+                if positions is None:
+                    positions = index[key] = array(str('i'))
+                positions.append(position)
+            self._indexes[name] = index
+        return index
+
+    def _get_index_criterion(self, name):
+        for criterion in self.indexes:
+            if isinstance(criterion, Criterion) and criterion.attrname == name:
+                return criterion
+        for brick in self.sorted:
+            if issubclass(_get_brick_class(brick), BaseListBrick):
+                raise ValueError(
+                    'Cannot filter list bricks by %r without a Criterion '
+                    'with that name in indexes.' % name)
+        # The same criterion for every wall, or the bricks that cache their
+        # values would keep one for each
+        criterion = _index_criteria.get(name)
+        if criterion is None:
+            criterion = _index_criteria[name] = Criterion(name)
+        return criterion
+
+    def _get_index_values(self, criterion, bricks):
+        """
+        Returns the values of the criterion for the given bricks, loading in
+        bulk the deferred ones that lack it. Those whose object no longer
+        exists get ``None``.
+        """
+        if not self._deferred or not any(
+                isinstance(brick, DeferredBrick) and
+                criterion not in brick.source.positions for brick in bricks):
+            return criterion.get_values(bricks)
+        _load_deferred(bricks)
+        bricks = [brick.brick if isinstance(brick, DeferredBrick) else brick
+                  for brick in bricks]
+        present = [position for position, brick in enumerate(bricks)
+                   if brick is not None]
+        values = [None] * len(bricks)
+        for position, value in zip(present, criterion.get_values(
+                [bricks[position] for position in present])):
+            values[position] = value
+        return values
+
+
+# The criteria of the attributes indexed by filter_by, by name
+_index_criteria = {}
+
+
+class WallOrdering(object):
+    """A sorted view over the bricks of a :class:`MultiOrderingWall`.
+
+    It can be sliced or iterated like a wall, but it only holds the position
+    of each brick in the shared list of bricks.
+    """
+
+    def __init__(self, bricks, positions):
+        self.bricks = bricks
+        self.positions = positions
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.bricks[i] for i in self.positions[key]]
+        return self.bricks[self.positions[key]]
+
+    def __iter__(self):
+        return (self.bricks[i] for i in self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+
+class MultiOrderingWall(object):
+    """Manager for a list of bricks that can be sorted in several ways.
+
+    The value of each criterion is extracted just once for each brick, then
+    the wall keeps, for each ordering, an array with the position of the
+    bricks in that order. Every ordering is served from the same list of
+    bricks, so caching the wall caches all of them.
+
+    :param bricks: the list of bricks to sort.
+    :param orderings: a dictionary of lists of criteria by name.
+    """
+
+    #: See :attr:`BaseWall.lexsort_threshold`.
+    lexsort_threshold = None
+
+    def __init__(self, bricks, orderings):
+        self.bricks = list(bricks)
+        self.orderings = orderings
+        self._positions = {}
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.bricks)
+
+    def __getstate__(self):
+        # We save the positions of every ordering and delete the criteria
+        # as those might not be pickable
+        for name in self.orderings:
+            self._get_positions(name)
+        obj_dict = self.__dict__.copy()
+        obj_dict['orderings'] = dict((name, None) for name in self.orderings)
+        obj_dict['_columns'] = {}
+        return obj_dict
+
+    def ordering(self, name):
+        """Returns a :class:`WallOrdering` with the bricks sorted by the
+        criteria of the given ordering."""
+        return WallOrdering(self.bricks, self._get_positions(name))
+
+    def _get_column(self, criterion):
+        column = self._columns.get(criterion)
+        if column is None:
+            column = self._columns[criterion] = criterion.get_values(
+                self.bricks)
+        return column
+
+    def _get_positions(self, name):
+        positions = self._positions.get(name)
+        if positions is None:
+            criteria = self.orderings[name] or ()
+            columns = [self._get_column(criterion) for criterion, _ in criteria]
+            decorated = list(zip(zip(*columns) if columns else
+                                 [()] * len(self.bricks),
+                                 range(len(self.bricks))))
+            _sort_large_decorated(decorated, [order for _, order in criteria],
+                                  self.lexsort_threshold)
+            positions = self._positions[name] = array(
+                str('i'), [position for _, position in decorated])
+            if len(self._positions) == len(self.orderings):
+                # Every ordering is built, the values are not needed anymore
+                self._columns = {}
+        return positions
+
 
 # ---------------------------------------------------------------------------
 # Wall Factory
 # ---------------------------------------------------------------------------
 
+def _get_relation(model, name):
+    """
+    Returns the relation of the model with the given attribute name, forward
+    or reverse, or ``None`` if there is no such relation.
+    """
+    for field in model._meta.get_fields():
+        if not field.is_relation:
+            continue
+        if field.auto_created and not field.concrete:
+            if field.get_accessor_name() == name:
+                return field
+        elif field.name == name:
+            return field
+    return None
+
+
+def _resolve_relation_path(model, path):
+    """
+    Returns the longest part of the ``__`` separated path that is made of
+    relations of the model, and whether it can be followed with
+    ``select_related``.
+    """
+    relations = []
+    selectable = True
+    for name in path.split('__'):
+        field = _get_relation(model, name)
+        if field is None:
+            break
+        relations.append(name)
+        if not (field.many_to_one or field.one_to_one):
+            selectable = False
+        model = field.related_model
+        if model is None:
+            # Generic foreign keys can only be prefetched
+            selectable = False
+            break
+    return '__'.join(relations), selectable
+
+
+_CURSOR_SALT = 'djangobricks.cursor'
+
+
+def _dump_cursor_value(value):
+    """
+    Returns a JSON value holding the given criterion value at full precision
+    along with a tag of its type, see :func:`_load_cursor_value`.
+    """
+    import datetime
+    import decimal
+    import uuid
+    # datetime before date, as it is a subclass of it
+    for tag, kind in (('datetime', datetime.datetime), ('date', datetime.date),
+                      ('time', datetime.time)):
+        if isinstance(value, kind):
+            return [tag, value.isoformat()]
+    if isinstance(value, datetime.timedelta):
+        return ['timedelta', [value.days, value.seconds, value.microseconds]]
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return [value.__class__.__name__.lower(), six.text_type(value)]
+    return [None, value]
+
+
+def _load_cursor_value(data):
+    """Returns the value dumped by :func:`_dump_cursor_value`."""
+    import datetime
+    import decimal
+    import uuid
+    from django.utils import dateparse
+    tag, value = data
+    if tag is None:
+        return value
+    if tag == 'timedelta':
+        return datetime.timedelta(*value)
+    parse = {
+        'datetime': dateparse.parse_datetime,
+        'date': dateparse.parse_date,
+        'time': dateparse.parse_time,
+        'decimal': decimal.Decimal,
+        'uuid': uuid.UUID,
+    }[tag]
+    value = parse(value)
+    if value is None:
+        raise ValueError('Invalid %s.' % tag)
+    return value
+
+
+def _encode_cursor(values, source, pk):
+    """
+    Returns the signed token of the position after a brick, given its
+    criteria values, the index of its queryset and its primary key.
+    """
+    from django.core import signing
+    return signing.dumps({'v': [_dump_cursor_value(v) for v in values],
+                          's': source, 'p': _dump_cursor_value(pk)},
+                         salt=_CURSOR_SALT, compress=True)
+
+
+def _decode_cursor(cursor):
+    """Returns the values, source and primary key of a cursor."""
+    from django.core import signing
+    try:
+        data = signing.loads(cursor, salt=_CURSOR_SALT)
+        return ([_load_cursor_value(v) for v in data['v']], data['s'],
+                _load_cursor_value(data['p']))
+    except (signing.BadSignature, ValueError, TypeError, KeyError,
+            ArithmeticError):
+        raise InvalidCursor('%r is not a valid cursor.' % cursor)
+
+
+def _after_key(fields, orders, values, inclusive=False):
+    """
+    Returns the ``Q`` object that selects the rows coming after the given
+    values of the fields, in the given orders, or ``None`` if there is none.
+    With ``inclusive``, the rows with the same values are selected too.
+    """
+    from django.db.models import Q
+    clauses = []
+    for position, (field, order) in enumerate(zip(fields, orders)):
+        lookups = dict(zip(fields[:position], values[:position]))
+        lookups['%s__%s' % (field, 'lt' if order < 0 else 'gt')] = \
+            values[position]
+        clauses.append(Q(**lookups))
+    if inclusive:
+        clauses.append(Q(**dict(zip(fields, values))))
+    if not clauses:
+        return None
+    return reduce(or_, clauses)
+
+
 class BaseWallFactory(object):
     """Helper class that simplifies and encapsulates the creation of a wall.
 
@@ -264,6 +2001,44 @@ class BaseWallFactory(object):
     :param wall_class: an optional class for the wall.
         Must subclass :class:`BaseWall`
     """
+
+    #: If ``True``, each queryset is ordered by the database as
+    #: :meth:`get_ordering` says and the bricks of every queryset are merged
+    #: lazily, reading only the rows needed by the slices of the wall.
+    presorted = False
+    #: The number of rows read by each query when :attr:`presorted` is set.
+    fetch_size = 100
+    #: If ``True``, only the primary key and the criteria values of each
+    #: object are read to sort the wall, as :meth:`get_key_fields` says. The
+    #: objects are loaded in bulk only for the bricks that are sliced or
+    #: iterated. Brick classes that cannot defer their bricks are built as
+    #: usual. See :class:`DeferredBrick`.
+    deferred = False
+    #: The key of the wall in the cache, or ``None`` not to cache it. See
+    #: :meth:`get_cache_key`.
+    cache_key = None
+    #: The alias of the cache that keeps the wall.
+    cache_alias = 'default'
+    #: The number of seconds a cached wall is up to date for.
+    cache_timeout = 300
+    #: The number of seconds an expired wall is still served for, while a
+    #: single process builds it again.
+    cache_stale_timeout = 300
+    #: The number of seconds a process is given to build the wall before
+    #: another one tries.
+    cache_lock_timeout = 30
+    #: If ``True``, the querysets are read in parallel by a pool of threads,
+    #: each one with its own database connections, closed when done. Walls
+    #: that are :attr:`presorted` read their querysets lazily instead, and
+    #: inside a transaction they are read one after the other, since the
+    #: other connections would not see its changes.
+    concurrent = False
+    #: The maximum number of threads reading the querysets when
+    #: :attr:`concurrent` is set, by default one per queryset.
+    max_workers = None
+    #: The number of bricks of each page returned by :meth:`get_page`.
+    page_size = 20
+
     def __init__(self, criteria=None, wall_class=BaseWall):
         self.criteria = criteria or []
         self.wall_class = wall_class
@@ -286,24 +2061,314 @@ class BaseWallFactory(object):
         """
         raise NotImplementedError
 
+    def prepare_queryset(self, brick, queryset):
+        """
+        Returns the queryset the bricks of the given class are built from.
+
+        By default, it annotates the queryset with the expression of each
+        :class:`ExpressionCriterion` and fetches the relations returned by
+        :meth:`get_related`. Content that is not a ``QuerySet``, like a list
+        of objects, is returned as is.
+        """
+        from django.db.models.query import QuerySet
+        if not isinstance(queryset, QuerySet):
+            return queryset
+        annotations = dict((criterion.attrname, criterion.expression)
+                           for criterion, _ in self.criteria
+                           if isinstance(criterion, ExpressionCriterion))
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        select, prefetch = self.get_related(brick, queryset)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_related(self, brick, queryset):
+        """
+        Returns the lists of the relations to follow with ``select_related``
+        and to fetch with ``prefetch_related`` for the queryset.
+
+        Those are the ones declared by the brick class, along with the
+        relations traversed by the criteria: a path made of foreign keys and
+        one-to-one relations only is followed, any other is prefetched. The
+        criteria named after an annotation of the queryset, like
+        ``posts__count``, traverse no relation.
+        """
+        select = list(brick.select_related)
+        prefetch = list(brick.prefetch_related)
+        annotations = getattr(getattr(queryset, 'query', None),
+                              'annotations', None) or {}
+        for criterion, _ in self.criteria:
+            if criterion.attrname in annotations:
+                continue
+            for path in criterion.get_related_paths():
+                path, selectable = _resolve_relation_path(queryset.model, path)
+                if not path:
+                    continue
+                paths = select if selectable else prefetch
+                if path not in paths:
+                    paths.append(path)
+        return select, prefetch
+
+    def get_key_fields(self, brick, queryset):
+        """
+        Returns the name of the field, or annotation, holding the value of
+        each criterion for the objects of the queryset.
+
+        By default, it is the :attr:`Criterion.attrname`. Override it when
+        a criterion does not map to a field with the same name.
+        """
+        return [criterion.attrname for criterion, _ in self.criteria]
+
+    def get_ordering(self, brick, queryset):
+        """
+        Returns the fields the queryset should be ordered by when
+        :attr:`presorted` is set, so that its bricks come in the same order
+        as the wall.
+
+        By default, the fields are the ones of :meth:`get_key_fields`,
+        followed by the current ordering of the queryset and the primary key
+        to break ties.
+        """
+        fields = [('-' if order < 0 else '') + field for field, (_, order)
+                  in zip(self.get_key_fields(brick, queryset), self.criteria)]
+        query = queryset.query
+        if query.order_by:
+            fields.extend(query.order_by)
+        elif query.default_ordering:
+            fields.extend(queryset.model._meta.ordering)
+        fields.append('pk')
+        return fields
+
+    def get_cache_key(self):
+        """
+        Returns the key of the wall in the cache, by default
+        :attr:`cache_key`. Override it if the content or the criteria change
+        from a factory to another, for example with the user.
+        """
+        return self.cache_key
+
+    def invalidate_cache(self):
+        """Deletes the wall from the cache."""
+        key = self.get_cache_key()
+        if key is not None:
+            from django.core.cache import caches
+            caches[self.cache_alias].delete(key)
+
     def wall(self):
         """Returns a configured instance of the wall.
 
+        If :meth:`get_cache_key` returns a key, the wall is read from the
+        cache, see :func:`djangobricks.cache.get_cached_wall`. A cached wall
+        is pickled, which sorts it.
+
         Normally you should not override this method unless you want to
         manipulate the list of bricks somehow. In that case make sure you call
         super before applying your logic.
         """
-        def content_iterator():
-            # Do some sanity check just to help the user
-            for brick, queryset in self.get_content():
-                if not issubclass(brick, BaseBrick):
-                    raise TypeError("Expected a BaseBrick subclass, "
-                                    "got %r instead" % brick)
-                yield brick, queryset
-
-        bricks = (b.get_bricks_for_queryset(qs) for b, qs in content_iterator())
-        bricks_list = list(chain.from_iterable(bricks))
-        return self.wall_class(bricks_list, self.criteria)
+        key = self.get_cache_key()
+        if key is None:
+            return self.build_wall()
+        from djangobricks.cache import get_cached_wall
+        wall = get_cached_wall(self, key)
+        # Pickled walls do not carry the criteria along
+        wall.criteria = self.criteria
+        self._bind_sources(wall)
+        return wall
+
+    def _bind_sources(self, wall):
+        # The objects of a compact pickled wall are loaded back from the
+        # querysets of the factory, with their annotations and relations.
+        sources = getattr(wall, '_sources', None)
+        if not sources:
+            return
+        querysets = {}
+        for brick, queryset in self._content_iterator():
+            model = getattr(queryset, 'model', None)
+            if model is not None:
+                querysets.setdefault((brick, model), queryset)
+        for source in sources:
+            queryset = querysets.get((source.brick_class,
+                                      source.queryset.model))
+            if queryset is not None:
+                source.queryset = queryset
+
+    def awall(self):
+        """
+        Returns an awaitable that builds the wall without blocking the event
+        loop. The querysets are read in parallel only if the factory is
+        :attr:`concurrent`, and the bricks of :attr:`presorted` or
+        :attr:`deferred` walls are all loaded. The wall is not cached. See
+        :func:`djangobricks.asynchronous.build_wall`.
+
+        Requires Python 3.6.
+        """
+        from djangobricks.asynchronous import build_wall
+        return build_wall(self)
+
+    def build_wall(self):
+        """Returns a new instance of the wall, bypassing the cache."""
+        with metrics.timed('bricks.wall.build', factory=self.__class__.__name__):
+            return self._build_wall()
+
+    def _build_wall(self):
+        if self.presorted:
+            sources = (self._get_bricks(b, qs.order_by(*self.get_ordering(b, qs)),
+                                        stream=True)
+                       for b, qs in self._content_iterator())
+            wall = self.wall_class.merged(sources, self.criteria)
+        else:
+            wall = self.wall_class(self.get_bricks(), self.criteria)
+        wall._deferred = self.deferred
+        return wall
+
+    def get_page(self, cursor=None, size=None):
+        """
+        Returns the list of the bricks of the page that follows the given
+        cursor, or of the first page, and the cursor of the next page, or
+        ``None`` if it is the last one.
+
+        The cursor is an opaque and signed string holding the criteria values
+        of the last brick of the page, the index of its queryset and its
+        primary key. Each queryset is filtered to the rows after it, ordered
+        by the fields of :meth:`get_key_fields` and the primary key, and read
+        up to ``size`` rows, :attr:`page_size` by default, so that any page
+        costs the same as the first one. The bricks of the page are sorted as
+        the wall would, the ties in the order of the querysets.
+
+        Only :class:`BaseSingleBrick` subclasses can be paged, and the
+        criteria values must be the values of the fields, which cannot be
+        ``NULL``.
+        Raises :class:`djangobricks.exceptions.InvalidCursor` if the cursor
+        was not returned by this method.
+        """
+        size = size or self.page_size
+        orders = [order for _, order in self.criteria]
+        after = _decode_cursor(cursor) if cursor is not None else None
+        bricks = []
+        sources = {}
+        for index, (brick, queryset) in enumerate(self._content_iterator()):
+            if not issubclass(brick, BaseSingleBrick):
+                raise TypeError('Cannot page the bricks of %r, only those of '
+                                'a BaseSingleBrick subclass.' % brick)
+            fields = list(self.get_key_fields(brick, queryset))
+            if after is not None:
+                values, source, pk = after
+                if index == source:
+                    # The tie is broken by the primary key
+                    where = _after_key(fields + ['pk'], orders + [SORTING_ASC],
+                                       values + [pk])
+                else:
+                    # The tie is broken by the order of the querysets
+                    where = _after_key(fields, orders, values,
+                                       inclusive=index > source)
+                queryset = (queryset.filter(where) if where is not None
+                            else queryset.none())
+            ordering = [('-' if order < 0 else '') + field
+                        for field, order in zip(fields, orders)] + ['pk']
+            for item in brick.get_bricks_for_queryset(
+                    queryset.order_by(*ordering)[:size + 1]):
+                sources[id(item)] = index
+                bricks.append(item)
+        wall = self.wall_class(bricks, self.criteria)
+        page = wall[:size + 1]
+        if len(page) <= size:
+            return page, None
+        page = page[:size]
+        last = page[-1]
+        return page, _encode_cursor(wall.get_sort_key(last), sources[id(last)],
+                                    last.item.pk)
+
+    def get_bricks(self):
+        """
+        Returns the list of the bricks of every queryset, not sorted.
+
+        Use it to build a wall of another kind, like a
+        :class:`MultiOrderingWall`, from the same content.
+        """
+        content = list(self._content_iterator())
+        if self.concurrent and not _in_atomic_block(content):
+            from concurrent.futures import ThreadPoolExecutor
+            workers = self.max_workers or len(content) or 1
+            with ThreadPoolExecutor(workers) as executor:
+                bricks = list(executor.map(lambda args: self._fetch_bricks(*args),
+                                           content))
+        else:
+            get_bricks = (self._get_measured_bricks if metrics._callbacks
+                          else self._get_bricks)
+            bricks = (get_bricks(b, qs) for b, qs in content)
+        return list(chain.from_iterable(bricks))
+
+    def _fetch_bricks(self, brick, queryset):
+        # Runs in a thread of its own, that must not leave connections open
+        from django.db import connections
+        try:
+            if metrics._callbacks:
+                return self._get_measured_bricks(brick, queryset)
+            return list(self._get_bricks(brick, queryset))
+        finally:
+            connections.close_all()
+
+    def _get_measured_bricks(self, brick, queryset):
+        """
+        Returns the list of the bricks of a queryset and reports the metrics
+        of the source, see :mod:`djangobricks.metrics`.
+        """
+        from django.db import connections
+        counter = metrics.QueryCounter()
+        database = getattr(queryset, 'db', None)
+        wrapper = getattr(connections[database], 'execute_wrapper',
+                          None) if database else None
+        start = metrics.timer()
+        if wrapper is None:
+            # Before Django 2.0, or not a queryset
+            bricks = list(self._get_bricks(brick, queryset))
+        else:
+            with wrapper(counter):
+                bricks = list(self._get_bricks(brick, queryset))
+        elapsed = metrics.timer() - start
+        model = getattr(queryset, 'model', None)
+        tags = {'brick': brick.__name__,
+                'model': _model_label(model) if model is not None else None}
+        metrics.emit('bricks.source.time', elapsed, **tags)
+        metrics.emit('bricks.source.bricks', len(bricks), **tags)
+        if wrapper is not None:
+            metrics.emit('bricks.source.queries', counter.count, **tags)
+            metrics.emit('bricks.source.query_time', counter.time, **tags)
+        return bricks
+
+    def _content_iterator(self):
+        # Do some sanity check just to help the user
+        for brick, queryset in self.get_content():
+            if not issubclass(brick, BaseBrick):
+                raise TypeError("Expected a BaseBrick subclass, "
+                                "got %r instead" % brick)
+            yield brick, self.prepare_queryset(brick, queryset)
+
+    def _get_bricks(self, brick, queryset, stream=False):
+        if self.deferred:
+            bricks = brick.get_deferred_bricks_for_queryset(
+                queryset, self.criteria, self.get_key_fields(brick, queryset))
+            if bricks is not None:
+                return bricks
+        if stream:
+            return brick.stream_bricks_for_queryset(queryset, self.fetch_size)
+        return brick.get_bricks_for_queryset(queryset)
+
+def _in_atomic_block(content):
+    """
+    Returns whether the connection of any of the querysets is in a
+    transaction, whose changes the connections of other threads do not see.
+    """
+    from django.db import connections
+    for _, queryset in content:
+        database = getattr(queryset, 'db', None)
+        if database and connections[database].in_atomic_block:
+            return True
+    return False
+
 
 def wall_factory(content, brick_class, criteria=None, wall_class=BaseWall):
     """
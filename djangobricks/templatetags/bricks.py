@@ -1,12 +1,50 @@
 from __future__ import unicode_literals
 
 from django import template
-from django.template.loader import render_to_string
+from django.template.context import make_context
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
 
+from djangobricks import metrics
+from djangobricks.cache import render_cached
 from djangobricks.exceptions import TemplateNameNotFound
 
 register = template.Library()
 
+
+def _check_template_name(brick):
+    if brick.template_name is None:
+        raise TemplateNameNotFound('%r does not define '
+                                   'any template name.' % brick.__class__)
+
+
+def _get_context(brick, extra_context):
+    dictionary = brick.get_context()
+    dictionary.update(extra_context)
+    return dictionary
+
+
+def _render_each(bricks, render):
+    """
+    Returns the list of ``render(brick)`` for the given bricks and reports the
+    time spent with each template, see :mod:`djangobricks.metrics`.
+    """
+    if not metrics._callbacks:
+        return [render(brick) for brick in bricks]
+    output = []
+    totals = {}
+    for brick in bricks:
+        start = metrics.timer()
+        output.append(render(brick))
+        total = totals.setdefault(brick.template_name, [0.0, 0])
+        total[0] += metrics.timer() - start
+        total[1] += 1
+    for name, (elapsed, count) in totals.items():
+        metrics.emit('bricks.render', elapsed, template=name)
+        metrics.emit('bricks.render.bricks', count, template=name)
+    return output
+
+
 @register.simple_tag(takes_context=True)
 def render_brick(context, brick, **extra_context):
     """
@@ -16,12 +54,70 @@ def render_brick(context, brick, **extra_context):
     instance, otherwise it will default to `Context`.
     The method accepts keyword arguments that will be passed as extra context
     to the brick.
+    If the brick defines a `cache_timeout`, its HTML is cached.
     """
-    if brick.template_name is None:
-        raise TemplateNameNotFound('%r does not define '
-                                   'any template name.' % brick.__class__)
+    _check_template_name(brick)
 
     request = context.get('request')
-    dictionary = brick.get_context()
-    dictionary.update(extra_context)
-    return render_to_string(brick.template_name, dictionary, request=request)
+
+    def render(bricks):
+        return _render_each(bricks, lambda brick: render_to_string(
+            brick.template_name, _get_context(brick, extra_context),
+            request=request))
+    if brick.cache_timeout is None:
+        return render([brick])[0]
+    return mark_safe(render_cached([brick], extra_context, render)[0])
+
+
+def render_bricks(bricks, request=None, **extra_context):
+    """
+    Renders the given bricks one after the other and returns the result, the
+    same as calling :func:`render_brick` for each one.
+
+    Each template is looked up once, and the context processors run once
+    if a `request` is given, no matter how many bricks are rendered.
+    The bricks that define a `cache_timeout` are read from the cache all at
+    once, and only the missing ones are rendered.
+    """
+    bricks = list(bricks)
+    for brick in bricks:
+        _check_template_name(brick)
+    return mark_safe(''.join(render_cached(
+        bricks, extra_context,
+        lambda missing: _render_bricks(missing, request, extra_context))))
+
+
+def _render_bricks(bricks, request, extra_context):
+    templates = {}
+    for brick in bricks:
+        if brick.template_name not in templates:
+            templates[brick.template_name] = get_template(brick.template_name)
+    if not bricks:
+        return []
+
+    # Only the templates of the Django backend can share a context
+    django_templates = dict((name, getattr(t, 'template', None))
+                            for name, t in templates.items())
+    if None in django_templates.values():
+        return _render_each(bricks, lambda brick: templates[
+            brick.template_name].render(_get_context(brick, extra_context),
+                                        request))
+
+    def render(brick):
+        with context.push(_get_context(brick, extra_context)):
+            return django_templates[brick.template_name].render(context)
+
+    context = make_context({}, request)
+    # Binding the context to a template runs the context processors, the
+    # templates rendered while it is bound share their result.
+    with context.bind_template(django_templates[bricks[0].template_name]):
+        return _render_each(bricks, render)
+
+
+@register.simple_tag(takes_context=True)
+def render_wall(context, bricks, **extra_context):
+    """
+    Renders a list of bricks, for example a slice of a wall, in one go.
+    See :func:`render_bricks`.
+    """
+    return render_bricks(bricks, context.get('request'), **extra_context)
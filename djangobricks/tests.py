@@ -2,16 +2,37 @@ from __future__ import unicode_literals
 
 import datetime
 import os
+import threading
 import unittest
 
+try:
+    from unittest import mock
+except ImportError:
+    # Python 2
+    import mock
 from django import get_version
-from django.db import models
+from django.core.cache import caches
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.db.models import Count, F, Max
 from django.template import Template, Context
-from django.test import SimpleTestCase
-from django.test.utils import override_settings
+from django.template.loader import get_template
+from django.test import RequestFactory, SimpleTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 
 from six.moves import range
 
+try:
+    import asyncio
+except ImportError:
+    # Python 2
+    asyncio = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 try:
     from django.utils.encoding import python_2_unicode_compatible
 except ImportError:
@@ -29,14 +50,24 @@ except ImportError:
 from .models import (
     SingleBrick,
     ListBrick,
+    SlottedListBrick,
+    SlottedSingleBrick,
     BaseWall,
     Criterion,
     SORTING_DESC,
     SORTING_ASC,
     BaseWallFactory,
+    DeferredBrick,
+    DeferredListBrick,
+    ExpressionCriterion,
+    ItemSlice,
+    MultiOrderingWall,
     wall_factory,
 )
-from djangobricks.exceptions import TemplateNameNotFound
+from djangobricks import metrics
+from djangobricks.cache import connect_fragment_cache
+from djangobricks.exceptions import InvalidCursor, TemplateNameNotFound
+from djangobricks.templatetags.bricks import render_bricks
 
 CURRENT_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -66,6 +97,19 @@ def callback_filter_b(brick):
 def callback_filter_always_true(brick):
     return True
 
+def counting_context_processor(request):
+    counting_context_processor.calls += 1
+    return {'foo': 'processed'}
+counting_context_processor.calls = 0
+
+COUNTING_TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'DIRS': [os.path.join(CURRENT_DIR, '..', 'tests', 'templates')],
+    'OPTIONS': {
+        'context_processors': ['djangobricks.tests.counting_context_processor'],
+    },
+}]
+
 class TestSingleBrick(SingleBrick):
     template_name = 'single_brick.html'
 
@@ -74,15 +118,83 @@ class TestListBrick(ListBrick):
     template_name = 'list_brick.html'
 
 
+class TestSharedListBrick(TestListBrick):
+    share_items = True
+
+
+class TestFragmentSingleBrick(TestSingleBrick):
+    cache_timeout = 60
+    cache_version_attribute = 'popularity'
+
+
+class TestFragmentListBrick(TestListBrick):
+    cache_timeout = 60
+
+
 class TestNoTemplateSingleBrick(SingleBrick): pass
 
 
+class TestCachedSingleBrick(SingleBrick):
+    cache_criteria = True
+
+
+class TestSlottedSingleBrick(SlottedSingleBrick):
+    __slots__ = ()
+    template_name = 'single_brick.html'
+
+
+class TestSlottedListBrick(SlottedListBrick):
+    __slots__ = ()
+    template_name = 'list_brick.html'
+
+
+class TestSlottedCachedBrick(SlottedSingleBrick):
+    __slots__ = ('extra',)
+    cache_criteria = True
+
+
 class NotABrick(object): pass
 
 
 class TestBrickWall(BaseWall): pass
 
 
+class TestCompactBrickWall(BaseWall):
+    compact_pickle = True
+
+
+class TestIndexedBrickWall(BaseWall):
+    indexes = ('is_sticky', Criterion('popularity', default=0))
+
+
+class AsyncList(object):
+    """A list that can only be read with ``async for``."""
+    def __init__(self, items):
+        self.items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = asyncio.get_event_loop().create_future()
+        try:
+            future.set_result(next(self.items))
+        except StopIteration:
+            future.set_exception(StopAsyncIteration())
+        return future
+
+
+class CountingCriterion(Criterion):
+    """A criterion that keeps track of how many values it computed."""
+    def __init__(self, *args, **kwargs):
+        super(CountingCriterion, self).__init__(*args, **kwargs)
+        self.calls = 0
+
+    def get_value_for_item(self, item):
+        self.calls += 1
+        return super(CountingCriterion, self).get_value_for_item(item)
+
+
 @python_2_unicode_compatible
 class TestModelA(models.Model):
     name = models.CharField(max_length=8)
@@ -122,6 +234,40 @@ class TestModelC(models.Model):
         return self.name
 
 
+@python_2_unicode_compatible
+class TestThread(models.Model):
+    comment_count = models.PositiveIntegerField()
+
+    def __str__(self):
+        return 'thread %s' % self.comment_count
+
+
+@python_2_unicode_compatible
+class TestPost(models.Model):
+    name = models.CharField(max_length=8)
+    thread = models.ForeignKey(TestThread, related_name='posts',
+                               on_delete=models.CASCADE)
+
+    def __str__(self):
+        return self.name
+
+
+class TestPostBrick(SingleBrick):
+    select_related = ('thread',)
+
+
+class TestThreadBrick(SingleBrick):
+    prefetch_related = ('posts',)
+
+
+class TestRelatedWallFactory(BaseWallFactory):
+    def get_content(self):
+        return (
+            (TestPostBrick, TestPost.objects.all()),
+            (TestThreadBrick, TestThread.objects.all()),
+        )
+
+
 class TestWallFactory(BaseWallFactory):
     def get_content(self):
         return (
@@ -138,6 +284,35 @@ class TestWallFactoryNoCriteria(BaseWallFactory):
         )
 
 
+class TestPresortedWallFactory(TestWallFactory):
+    presorted = True
+    fetch_size = 2
+
+
+class TestDeferredWallFactory(TestWallFactory):
+    deferred = True
+
+
+class TestCachedWallFactory(TestWallFactory):
+    cache_key = 'test-wall'
+
+
+class TestMixedWallFactory(BaseWallFactory):
+    def get_content(self):
+        return (
+            (TestSingleBrick, TestModelA.objects.all()),
+            (TestListBrick, TestModelC.objects.order_by('pk')),
+        )
+
+
+class TestDeferredMixedWallFactory(TestMixedWallFactory):
+    deferred = True
+
+
+class TestConcurrentWallFactory(TestMixedWallFactory):
+    concurrent = True
+
+
 class TestWrongContentWallFactory(BaseWallFactory):
     def get_content(self):
         return (
@@ -154,6 +329,8 @@ class BrickTest(SimpleTestCase):
         self.bricks = []
 
     def tearDown(self):
+        TestPost.objects.all().delete()
+        TestThread.objects.all().delete()
         TestModelA.objects.all().delete()
         TestModelB.objects.all().delete()
         TestModelC.objects.all().delete()
@@ -563,6 +740,128 @@ class BrickTest(SimpleTestCase):
         expected = reversed(expected)
         self.assertEqual(list(reversed(list(wall))), list(expected))
 
+    # Sort engine
+
+    def test_sort_extracts_values_once(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        sticky = CountingCriterion('is_sticky')
+        popularity = CountingCriterion('popularity')
+        wall = TestBrickWall(self.bricks, criteria=(
+            (sticky, SORTING_DESC),
+            (popularity, SORTING_ASC),
+        ))
+        list(wall)
+        self.assertEqual(sticky.calls, len(self.bricks))
+        self.assertEqual(popularity.calls, len(self.bricks))
+
+    def test_sort_matches_cmp(self):
+        from functools import cmp_to_key
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        for orders in ((SORTING_ASC, SORTING_ASC), (SORTING_DESC, SORTING_DESC),
+                       (SORTING_ASC, SORTING_DESC), (SORTING_DESC, SORTING_ASC)):
+            wall = TestBrickWall(self.bricks, criteria=(
+                (Criterion('is_sticky', max, default=False), orders[0]),
+                (Criterion('pub_date', max), orders[1]),
+            ))
+            expected = sorted(self.bricks, key=cmp_to_key(wall._cmp))
+            self.assertEqual(list(wall), expected)
+
+    def test_sort_cmp_override(self):
+        class NameWall(TestBrickWall):
+            def _cmp(self, left, right):
+                left, right = left.item.name, right.item.name
+                return (right > left) - (right < left)
+
+        self._create_model_a_objects_and_bricks()
+        # The criteria would give the opposite order
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        expected = [self.brickA4, self.brickA3, self.brickA2, self.brickA1]
+        self.assertEqual(NameWall(self.bricks, criteria)[:2], expected[:2])
+        self.assertEqual(list(NameWall(self.bricks, criteria)), expected)
+        wall = NameWall(expected[1:3], criteria)
+        list(wall)
+        wall.add([self.brickA1, self.brickA4])
+        self.assertEqual(list(wall), expected)
+        wall = NameWall.merged([expected[::2], expected[1::2]], criteria)
+        self.assertEqual(list(wall), expected)
+
+    def test_sort_ties_keep_original_order(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('is_sticky'), SORTING_DESC),
+        ))
+        expected = [self.brickA3, self.brickB3,
+                    self.brickA1, self.brickA2, self.brickA4,
+                    self.brickB1, self.brickB2, self.brickB4]
+        self.assertEqual(list(wall), expected)
+
+    # Partial sort
+
+    def _partial_sort_walls(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        for orders in ((SORTING_ASC, SORTING_ASC), (SORTING_DESC, SORTING_DESC),
+                       (SORTING_ASC, SORTING_DESC), (SORTING_DESC, SORTING_ASC)):
+            criteria = (
+                (Criterion('is_sticky', max, default=False), orders[0]),
+                (Criterion('popularity', max), orders[1]),
+            )
+            yield (TestBrickWall(self.bricks, criteria=criteria),
+                   list(TestBrickWall(self.bricks, criteria=criteria)))
+
+    def test_partial_sort_slicing(self):
+        for wall, expected in self._partial_sort_walls():
+            self.assertEqual(wall[:3], expected[:3])
+            self.assertEqual(wall[2:5], expected[2:5])
+            self.assertEqual(wall[0:6:2], expected[0:6:2])
+            self.assertEqual(wall[1], expected[1])
+            self.assertEqual(wall[:100], expected)
+            self.assertEqual(wall[-2:], expected[-2:])
+
+    def test_partial_sort_ties(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        for order in (SORTING_ASC, SORTING_DESC):
+            criteria = ((Criterion('is_sticky'), order),)
+            expected = list(TestBrickWall(self.bricks, criteria=criteria))
+            for stop in range(1, len(self.bricks)):
+                wall = TestBrickWall(self.bricks, criteria=criteria)
+                self.assertEqual(wall[:stop], expected[:stop])
+
+    def test_partial_sort_is_lazy(self):
+        for wall, expected in self._partial_sort_walls():
+            self.assertEqual(wall[:2], expected[:2])
+            self.assertIsNone(wall._sorted)
+            self.assertEqual(list(wall), expected)
+            self.assertEqual(wall._sorted, expected)
+
+    def test_partial_sort_extracts_values_once(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criterion = CountingCriterion('popularity')
+        wall = TestBrickWall(self.bricks, criteria=((criterion, SORTING_DESC),))
+        wall[:2]
+        wall[:4]
+        list(wall)
+        self.assertEqual(criterion.calls, len(self.bricks))
+
+    def test_partial_sort_iteration_stops_early(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_DESC),
+        ))
+        self.assertEqual(wall.head(2), [self.brickB1, self.brickB2])
+        for brick in wall:
+            break
+        self.assertEqual(brick, self.brickB1)
+        self.assertIsNone(wall._sorted)
+
     # Pickle
 
     def test_pickle(self):
@@ -660,6 +959,47 @@ class BrickTest(SimpleTestCase):
         with self.assertRaises(TemplateNameNotFound):
             template.render(Context({'brick': brick}))
 
+    def _create_render_wall_bricks(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        return [TestSingleBrick(b.item) for b in self.bricks[:4]] + [
+            TestListBrick(b.items) for b in self.bricks[4:]]
+
+    def test_template_tag_render_wall(self):
+        bricks = self._create_render_wall_bricks()
+        template = Template('{% load bricks %}{% render_wall bricks foo="bar" %}')
+        html = template.render(Context({'bricks': bricks}))
+        self.assertEqual(html.split(), [
+            'objectA1bar', 'objectA2bar', 'objectA3bar', 'objectA4bar',
+            'objectC1objectC2', 'objectC3objectC4'])
+        with self.assertTemplateUsed('list_brick.html'):
+            template.render(Context({'bricks': bricks}))
+
+    def test_template_tag_render_wall_no_template(self):
+        bricks = self._create_render_wall_bricks()
+        bricks.append(TestNoTemplateSingleBrick(bricks[0].item))
+        template = Template('{% load bricks %}{% render_wall bricks %}')
+        with self.assertRaises(TemplateNameNotFound):
+            template.render(Context({'bricks': bricks}))
+        self.assertEqual(template.render(Context({'bricks': []})), '')
+
+    def test_render_bricks_once(self):
+        bricks = self._create_render_wall_bricks()
+        request = RequestFactory().get('/')
+        with override_settings(TEMPLATES=COUNTING_TEMPLATES):
+            counting_context_processor.calls = 0
+            with mock.patch('djangobricks.templatetags.bricks.get_template',
+                    wraps=get_template) as lookup:
+                html = render_bricks(bricks, request)
+            self.assertEqual(lookup.call_count, 2)
+            self.assertEqual(counting_context_processor.calls, 1)
+            # The output is the same as rendering each brick on its own
+            template = Template('{% load bricks %}{% for brick in bricks %}'
+                                '{% render_brick brick %}{% endfor %}')
+            self.assertEqual(html, template.render(
+                Context({'bricks': bricks, 'request': request})))
+        self.assertIn('objectA1processed', html)
+
     # Filtering
 
     @skipIf(get_version().startswith('1.5'), 'Django is too old')
@@ -786,3 +1126,1573 @@ class BrickTest(SimpleTestCase):
                     self.brickA1.item, self.brickA2.item, self.brickA4.item,
                     self.brickB3.item, self.brickA3.item]
         self.assertEqual([b.item for b in wall], expected)
+
+    # Presorted sources
+
+    def test_merged_wall(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        criteria = (
+            (Criterion('is_sticky', max, default=False), SORTING_DESC),
+            (Criterion('popularity', max), SORTING_ASC),
+        )
+        expected = list(TestBrickWall(self.bricks, criteria))
+        sources = [list(TestBrickWall(self.bricks[:4], criteria)),
+                   list(TestBrickWall(self.bricks[4:8], criteria)),
+                   list(TestBrickWall(self.bricks[8:], criteria))]
+        wall = TestBrickWall.merged(sources, criteria)
+        self.assertEqual(wall[:3], expected[:3])
+        self.assertEqual(list(wall), expected)
+        self.assertEqual(len(wall), len(expected))
+
+    def test_presorted_factory(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        for orders in ((SORTING_ASC, SORTING_DESC), (SORTING_DESC, SORTING_DESC),
+                       (SORTING_ASC, SORTING_ASC)):
+            criteria = (
+                (Criterion('is_sticky'), orders[0]),
+                (Criterion('popularity'), orders[1]),
+            )
+            expected = [b.item for b in TestWallFactory(criteria).wall()]
+            wall = TestPresortedWallFactory(criteria).wall()
+            self.assertEqual([b.item for b in wall[:3]], expected[:3])
+            self.assertEqual([b.item for b in wall], expected)
+            self.assertEqual(len(wall), len(expected))
+
+    def test_presorted_factory_reads_first_page_only(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        wall = TestPresortedWallFactory(criteria).wall()
+        with CaptureQueriesContext(connection) as queries:
+            bricks = wall[:2]
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([b.item for b in bricks],
+                         [self.brickB1.item, self.brickB2.item])
+
+    def test_presorted_factory_bool(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        wall = TestPresortedWallFactory(criteria).wall()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(wall)
+        # The first row of each queryset only
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(TestBrickWall([], criteria))
+        self.assertFalse(TestBrickWall.merged([[], []], criteria))
+        self.assertTrue(TestBrickWall(self.bricks, criteria).filter(
+            callback_filter_a))
+
+    def test_pickle_lazy_walls(self):
+        import pickle
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        sorted_wall = TestBrickWall(self.bricks, criteria)
+        list(sorted_wall)
+        walls = [
+            TestPresortedWallFactory(criteria).wall(),
+            TestBrickWall(self.bricks, criteria).filter(callback_filter_a),
+            sorted_wall.filter(callback_filter_a),
+        ]
+        for wall, count in zip(walls, (8, 4, 4)):
+            wall = pickle.loads(pickle.dumps(wall))
+            self.assertEqual(len(wall), count)
+            self.assertTrue(wall)
+            self.assertEqual(len(list(wall)), count)
+
+    def test_list_brick_stream(self):
+        now = datetime.datetime.now()
+        for i in range(12):
+            TestModelC.objects.create(name=i, popularity=i, pub_date=now)
+        queryset = TestModelC.objects.order_by('pk')
+        expected = TestListBrick.get_bricks_for_queryset(queryset)
+        with CaptureQueriesContext(connection) as queries:
+            bricks = list(TestListBrick.stream_bricks_for_queryset(queryset, 5))
+        self.assertEqual([b.items for b in bricks], [b.items for b in expected])
+        # A query per batch of 5 rows, the last one shorter
+        self.assertEqual(len(queries), 3)
+        with CaptureQueriesContext(connection) as queries:
+            bricks = list(TestSingleBrick.stream_bricks_for_queryset(queryset, 5))
+        self.assertEqual(len(bricks), 12)
+        self.assertEqual(len(queries), 3)
+
+    # Expression criteria
+
+    def test_expression_criterion(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((ExpressionCriterion('score', F('popularity') * 2), SORTING_DESC),)
+        expected = [self.brickB1.item, self.brickB2.item, self.brickB3.item,
+                    self.brickB4.item, self.brickA1.item, self.brickA2.item,
+                    self.brickA3.item, self.brickA4.item]
+        for factory_class in (TestWallFactory, TestPresortedWallFactory,
+                              TestDeferredWallFactory):
+            wall = factory_class(criteria).wall()
+            self.assertEqual([b.item for b in wall], expected)
+            self.assertEqual(wall[0].item.score, 20)
+
+    # Deferred bricks
+
+    def test_deferred_factory(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = (
+            (Criterion('is_sticky'), SORTING_ASC),
+            (Criterion('popularity'), SORTING_DESC),
+        )
+        expected = [b.item for b in TestWallFactory(criteria).wall()]
+        wall = TestDeferredWallFactory(criteria).wall()
+        self.assertTrue(all(isinstance(b, DeferredBrick) for b in wall.sorted))
+        self.assertEqual([b.item for b in wall[:3]], expected[:3])
+        self.assertEqual(wall[3].item, expected[3])
+        self.assertEqual(wall.head(2)[1].item, expected[1])
+        self.assertEqual([b.item for b in wall], expected)
+        self.assertTrue(all(isinstance(b, TestSingleBrick) for b in wall))
+
+    def test_deferred_factory_loads_slice_only(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        with CaptureQueriesContext(connection) as queries:
+            wall = TestDeferredWallFactory(criteria).wall()
+            bricks = wall[:2]
+        # One query per queryset for the keys, one for the two B objects
+        self.assertEqual(len(queries), 3)
+        self.assertEqual([b.item for b in bricks],
+                         [self.brickB1.item, self.brickB2.item])
+        self.assertFalse(any(b.loaded for b in wall.sorted[2:]))
+
+    def test_deferred_missing_object(self):
+        self._create_model_a_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        wall = TestDeferredWallFactory(criteria).wall()
+        wall.sorted
+        self.brickA1.item.delete()
+        self.assertEqual([b.item for b in wall],
+                         [self.brickA2.item, self.brickA3.item, self.brickA4.item])
+
+    def test_deferred_pickle(self):
+        import pickle
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_ASC),)
+        wall = TestDeferredWallFactory(criteria).wall()
+        wall[:1]
+        unpickled = pickle.loads(pickle.dumps(wall))
+        self.assertEqual([b.item for b in unpickled], [b.item for b in wall])
+
+    def test_deferred_list_bricks(self):
+        self._create_model_a_objects_and_bricks()
+        now = datetime.datetime(2012, 6, 1)
+        for i in range(12):
+            TestModelC.objects.create(name=i, popularity=i, pub_date=now,
+                                      is_sticky=i % 5 == 0)
+        criteria = (
+            (Criterion('is_sticky', max, default=False), SORTING_DESC),
+            (Criterion('pub_date', max), SORTING_DESC),
+        )
+        expected = list(TestMixedWallFactory(criteria).wall())
+        wall = TestDeferredMixedWallFactory(criteria).wall()
+        self.assertEqual(
+            sum(isinstance(b, DeferredListBrick) for b in wall.sorted), 3)
+        with CaptureQueriesContext(connection) as queries:
+            bricks = list(wall)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([getattr(b, 'item', None) for b in bricks],
+                         [getattr(b, 'item', None) for b in expected])
+        self.assertEqual([getattr(b, 'items', None) for b in bricks],
+                         [getattr(b, 'items', None) for b in expected])
+
+    def test_criterion_value_for_values(self):
+        criterion = Criterion('popularity', max, default=default)
+        self.assertEqual(criterion.get_value_for_values([1, 3, 2]), 3)
+        self.assertEqual(criterion.get_value_for_values([]), 1)
+
+    # Cached criteria
+
+    def _create_cached_bricks(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        return [TestCachedSingleBrick(b.item) for b in self.bricks]
+
+    def test_cached_criteria_across_walls(self):
+        bricks = self._create_cached_bricks()
+        sticky = CountingCriterion('is_sticky')
+        popularity = CountingCriterion('popularity')
+        walls = (
+            TestBrickWall(bricks, criteria=((popularity, SORTING_DESC),)),
+            TestBrickWall(bricks, criteria=((sticky, SORTING_DESC),
+                                            (popularity, SORTING_ASC))),
+            TestBrickWall(bricks, criteria=((sticky, SORTING_ASC),)),
+        )
+        for wall in walls:
+            list(wall)
+            wall.filter(lambda b: b.get_cached_value_for_criterion(sticky))
+        self.assertEqual(popularity.calls, len(bricks))
+        self.assertEqual(sticky.calls, len(bricks))
+
+    def test_cached_criteria_disabled(self):
+        self._create_model_a_objects_and_bricks()
+        popularity = CountingCriterion('popularity')
+        for _ in range(2):
+            list(TestBrickWall(self.bricks, criteria=((popularity, SORTING_DESC),)))
+        self.assertEqual(popularity.calls, 2 * len(self.bricks))
+
+    def test_invalidate_cached_criteria(self):
+        bricks = self._create_cached_bricks()
+        sticky = CountingCriterion('is_sticky')
+        popularity = CountingCriterion('popularity')
+        criteria = ((sticky, SORTING_DESC), (popularity, SORTING_DESC))
+        list(TestBrickWall(bricks, criteria=criteria))
+        bricks[0].item.popularity = 100
+        bricks[0].invalidate_criteria(popularity)
+        self.assertEqual(list(TestBrickWall(bricks, criteria=criteria))[2], bricks[0])
+        self.assertEqual(popularity.calls, len(bricks) + 1)
+        self.assertEqual(sticky.calls, len(bricks))
+        for brick in bricks:
+            brick.invalidate_criteria()
+        list(TestBrickWall(bricks, criteria=criteria))
+        self.assertEqual(sticky.calls, 2 * len(bricks))
+
+    def test_cached_criteria_pickle(self):
+        import pickle
+        bricks = self._create_cached_bricks()
+        criterion = Criterion('popularity', callback=lambda x: x)
+        bricks[0].get_cached_value_for_criterion(criterion)
+        unpickled = pickle.loads(pickle.dumps(bricks[0]))
+        self.assertEqual(unpickled.item, bricks[0].item)
+
+    # Multiple orderings
+
+    def _orderings(self, sticky, popularity):
+        return {
+            'popular': ((popularity, SORTING_DESC),),
+            'sticky': ((sticky, SORTING_DESC), (popularity, SORTING_ASC)),
+            'unsorted': (),
+        }
+
+    def test_multi_ordering_wall(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        sticky = CountingCriterion('is_sticky', max, default=False)
+        popularity = CountingCriterion('popularity', max)
+        orderings = self._orderings(sticky, popularity)
+        wall = MultiOrderingWall(self.bricks, orderings)
+        for name, criteria in orderings.items():
+            expected = list(TestBrickWall(self.bricks, criteria))
+            ordering = wall.ordering(name)
+            self.assertEqual(list(ordering), expected)
+            self.assertEqual(ordering[:3], expected[:3])
+            self.assertEqual(ordering[-1], expected[-1])
+            self.assertEqual(len(ordering), len(expected))
+        sticky.calls = popularity.calls = 0
+        wall = MultiOrderingWall(self.bricks, orderings)
+        for name in orderings:
+            wall.ordering(name)
+        items = sum(len(getattr(b, 'items', [b])) for b in self.bricks)
+        self.assertEqual(sticky.calls, items)
+        self.assertEqual(popularity.calls, items)
+
+    def test_multi_ordering_wall_pickle(self):
+        import pickle
+        wall = self._create_multi_ordering_wall_from_factory()
+        unpickled = pickle.loads(pickle.dumps(wall))
+        for name in ('popular', 'sticky'):
+            self.assertEqual([b.item for b in unpickled.ordering(name)],
+                             [b.item for b in wall.ordering(name)])
+
+    def test_multi_ordering_wall_from_factory(self):
+        wall = self._create_multi_ordering_wall_from_factory()
+        criteria = self._orderings(Criterion('is_sticky'), Criterion('popularity'))
+        for name in ('popular', 'sticky'):
+            expected = [b.item for b in TestWallFactory(criteria[name]).wall()]
+            self.assertEqual([b.item for b in wall.ordering(name)], expected)
+
+    def _create_multi_ordering_wall_from_factory(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        orderings = self._orderings(Criterion('is_sticky'), Criterion('popularity'))
+        return MultiOrderingWall(TestWallFactory().get_bricks(), orderings)
+
+    # Invalidation
+
+    def _count_sorts(self):
+        from djangobricks import models as bricks_models
+        return mock.patch.object(bricks_models, '_sort_decorated',
+                                 wraps=bricks_models._sort_decorated)
+
+    def test_empty_wall_sorted_once(self):
+        wall = TestBrickWall([], criteria=((Criterion('popularity'), SORTING_DESC),))
+        with self._count_sorts() as sort:
+            for _ in range(3):
+                list(wall)
+                wall[:2]
+                wall[0:0]
+        self.assertEqual(sort.call_count, 1)
+
+    def test_empty_filter_sorted_once(self):
+        self._create_model_a_objects_and_bricks()
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_DESC),
+        ))
+        with self._count_sorts() as sort:
+            filtered = wall.filter(lambda brick: False)
+            for _ in range(3):
+                self.assertEqual(list(filtered), [])
+                self.assertEqual(filtered[:2], [])
+        self.assertEqual(sort.call_count, 1)
+
+    def test_invalidate(self):
+        self._create_model_a_objects_and_bricks()
+        wall = TestBrickWall(self.bricks[:2], criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        with self._count_sorts() as sort:
+            self.assertEqual(list(wall), [self.brickA2, self.brickA1])
+            wall.bricks.extend(self.bricks[2:])
+            self.assertEqual(list(wall), [self.brickA2, self.brickA1])
+            wall.invalidate()
+            expected = [self.brickA4, self.brickA3, self.brickA2, self.brickA1]
+            self.assertEqual(list(wall), expected)
+            self.assertEqual(wall[:2], expected[:2])
+            self.assertEqual(len(wall), 4)
+        self.assertEqual(sort.call_count, 2)
+
+    def test_invalidate_iterator(self):
+        self._create_model_a_objects_and_bricks()
+        wall = TestBrickWall(iter(self.bricks), criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        expected = [self.brickA4, self.brickA3, self.brickA2, self.brickA1]
+        self.assertEqual(list(wall), expected)
+        wall.invalidate()
+        self.assertEqual(list(wall), expected)
+
+    def test_set_criteria(self):
+        self._create_model_a_objects_and_bricks()
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        with self._count_sorts() as sort:
+            list(wall)
+            wall.set_criteria(((Criterion('popularity'), SORTING_DESC),))
+            for _ in range(2):
+                self.assertEqual(list(wall), self.bricks)
+        self.assertEqual(sort.call_count, 2)
+
+    def test_set_criteria_filtered_wall(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        )).filter(callback_filter_a)
+        wall.set_criteria(((Criterion('is_sticky'), SORTING_DESC),
+                           (Criterion('popularity'), SORTING_DESC)))
+        self.assertEqual(list(wall), [self.brickA3, self.brickA1,
+                                      self.brickA2, self.brickA4])
+
+    # Incremental updates
+
+    def _create_incremental_bricks(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        return [
+            (Criterion('is_sticky', max, default=False), SORTING_DESC),
+            (Criterion('popularity', max), SORTING_ASC),
+        ]
+
+    def test_add_sorted_wall(self):
+        criteria = self._create_incremental_bricks()
+        wall = TestBrickWall(self.bricks[:3] + self.bricks[8:], criteria)
+        list(wall)
+        with self._count_sorts() as sort:
+            wall.add(self.bricks[3:8])
+            # A brick equal to another goes after it
+            wall.add([self.bricks[0]])
+        expected = list(TestBrickWall(self.bricks + [self.bricks[0]], criteria))
+        self.assertEqual(list(wall), expected)
+        self.assertEqual(len(wall), len(expected))
+        self.assertEqual(sort.call_count, 0)
+
+    def test_add_unsorted_wall(self):
+        criteria = self._create_incremental_bricks()
+        wall = TestBrickWall(self.bricks[:5], criteria)
+        wall[:2]
+        wall.add(self.bricks[5:])
+        expected = list(TestBrickWall(self.bricks, criteria))
+        self.assertEqual(wall[:2], expected[:2])
+        self.assertEqual(list(wall), expected)
+
+    def test_add_merged_wall(self):
+        criteria = self._create_incremental_bricks()
+        sources = [list(TestBrickWall(self.bricks[:4], criteria)),
+                   list(TestBrickWall(self.bricks[4:8], criteria))]
+        wall = TestBrickWall.merged(sources, criteria)
+        wall[:1]
+        wall.add(self.bricks[8:])
+        self.assertEqual(list(wall), list(TestBrickWall(self.bricks, criteria)))
+
+    def test_add_unpickled_wall(self):
+        import pickle
+        criteria = self._create_incremental_bricks()
+        wall = TestBrickWall(self.bricks[:8], criteria)
+        unpickled = pickle.loads(pickle.dumps(wall))
+        unpickled.criteria = criteria
+        unpickled.add(self.bricks[8:])
+        self.assertEqual([getattr(b, 'item', None) for b in unpickled],
+                         [getattr(b, 'item', None)
+                          for b in TestBrickWall(self.bricks, criteria)])
+
+    def test_remove(self):
+        criteria = self._create_incremental_bricks()
+        expected = [b for b in TestBrickWall(self.bricks, criteria)
+                    if isinstance(b, SingleBrick) and callback_filter_a(b)]
+        for sort_first in (True, False):
+            wall = TestBrickWall(self.bricks, criteria)
+            if sort_first:
+                list(wall)
+            wall.remove(lambda b: not isinstance(b, SingleBrick))
+            wall.remove(callback_filter_b)
+            self.assertEqual(len(wall), 4)
+            self.assertEqual(list(wall), expected)
+            wall.add([self.brickB1])
+            self.assertEqual(list(wall), expected + [self.brickB1])
+
+    def test_deferred_factory_sliced_queryset(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+
+        class SlicedWallFactory(BaseWallFactory):
+            deferred = True
+
+            def get_content(self):
+                return (
+                    (TestSingleBrick, TestModelA.objects.order_by('-pk')[:3]),
+                    (TestSingleBrick, TestModelB.objects.order_by('pk')[:2]),
+                )
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        wall = SlicedWallFactory(criteria).wall()
+        self.assertEqual([b.item for b in wall],
+                         [self.brickB1.item, self.brickB2.item,
+                          self.brickA2.item, self.brickA3.item,
+                          self.brickA4.item])
+
+    # Compact pickling
+
+    def test_compact_pickle(self):
+        import pickle
+        criteria = self._create_incremental_bricks()
+        wall = TestCompactBrickWall(self.bricks, criteria)
+        expected = list(TestBrickWall(self.bricks, criteria))
+        data = pickle.dumps(wall)
+        self.assertLess(len(data), len(pickle.dumps(TestBrickWall(self.bricks, criteria))))
+        with CaptureQueriesContext(connection) as queries:
+            unpickled = pickle.loads(data)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(unpickled), 10)
+        with CaptureQueriesContext(connection) as queries:
+            bricks = list(unpickled)
+        # One query per model
+        self.assertEqual(len(queries), 3)
+        self.assertEqual([getattr(b, 'item', None) for b in bricks],
+                         [getattr(b, 'item', None) for b in expected])
+        self.assertEqual([getattr(b, 'items', None) for b in bricks],
+                         [getattr(b, 'items', None) for b in expected])
+        self.assertEqual([b.__class__ for b in bricks],
+                         [b.__class__ for b in expected])
+
+    def test_compact_pickle_loads_slice_only(self):
+        import pickle
+        criteria = self._create_incremental_bricks()
+        wall = TestCompactBrickWall(self.bricks, criteria)
+        unpickled = pickle.loads(pickle.dumps(wall))
+        with CaptureQueriesContext(connection) as queries:
+            bricks = unpickled[:2]
+        # The first two bricks hold an A and a B object
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([b.item for b in bricks], [b.item for b in wall[:2]])
+
+    def test_compact_pickle_add(self):
+        import pickle
+        criteria = self._create_incremental_bricks()
+        wall = TestCompactBrickWall(self.bricks[:8], criteria)
+        unpickled = pickle.loads(pickle.dumps(wall))
+        unpickled.criteria = criteria
+        with CaptureQueriesContext(connection) as queries:
+            unpickled.add(self.bricks[8:])
+        # The keys of the unpickled bricks are not computed again
+        self.assertEqual(len(queries), 0)
+        self.assertEqual([getattr(b, 'item', None) for b in unpickled],
+                         [getattr(b, 'item', None)
+                          for b in TestBrickWall(self.bricks, criteria)])
+
+    def test_compact_pickle_deferred_wall(self):
+        import pickle
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_ASC),)
+        factory = TestDeferredWallFactory(criteria, TestCompactBrickWall)
+        wall = factory.wall()
+        unpickled = pickle.loads(pickle.dumps(wall))
+        self.brickA1.item.delete()
+        self.assertEqual([b.item for b in unpickled],
+                         [b.item for b in wall if b.item != self.brickA1.item])
+
+    def test_pickle_expression_criterion(self):
+        import pickle
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((ExpressionCriterion('score', F('popularity') * 2),
+                     SORTING_DESC),)
+        for wall_class in (TestBrickWall, TestCompactBrickWall):
+            wall = TestDeferredWallFactory(criteria, wall_class).wall()
+            unpickled = pickle.loads(pickle.dumps(wall))
+            self.assertEqual([b.item.score for b in unpickled],
+                             [20, 18, 16, 14, 10, 8, 6, 4])
+
+    def test_cached_compact_wall_expression_criterion(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((ExpressionCriterion('score', F('popularity') * 2),
+                     SORTING_DESC),)
+        factory = TestCachedWallFactory(criteria, TestCompactBrickWall)
+        factory.wall()
+        cached = factory.wall()
+        self.assertIsNotNone(cached._sources)
+        self.assertEqual([b.item.score for b in cached],
+                         [20, 18, 16, 14, 10, 8, 6, 4])
+
+    # Streaming list bricks
+
+    def _create_list_objects(self, count=12):
+        now = datetime.datetime(2012, 6, 1)
+        return [TestModelC.objects.create(name=i, popularity=i, pub_date=now)
+                for i in range(count)]
+
+    def test_list_brick_single_query(self):
+        objects = self._create_list_objects()
+        with CaptureQueriesContext(connection) as queries:
+            bricks = TestListBrick.iter_bricks_for_queryset(
+                TestModelC.objects.order_by('pk'))
+            self.assertEqual(len(queries), 0)
+            bricks = list(bricks)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'].upper())
+        self.assertEqual([b.items for b in bricks],
+                         [objects[:5], objects[5:10], objects[10:]])
+
+    def test_list_brick_evaluated_queryset(self):
+        objects = self._create_list_objects()
+        queryset = TestModelC.objects.order_by('pk')
+        list(queryset)
+        with CaptureQueriesContext(connection) as queries:
+            bricks = TestListBrick.get_bricks_for_queryset(queryset)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(bricks[2].items, objects[10:])
+
+    def test_list_brick_shared_items(self):
+        objects = self._create_list_objects()
+        for content in (objects, TestModelC.objects.order_by('pk')):
+            bricks = TestSharedListBrick.get_bricks_for_queryset(content)
+            self.assertEqual([len(b.items) for b in bricks], [5, 5, 2])
+            self.assertTrue(all(isinstance(b.items, ItemSlice) for b in bricks))
+            self.assertEqual(bricks[1].items, objects[5:10])
+            self.assertEqual(bricks[1].items[-1], objects[9])
+            self.assertEqual(bricks[1].items[1:3], objects[6:8])
+            criterion = Criterion('popularity', max)
+            self.assertEqual(bricks[1].get_value_for_criterion(criterion), 9)
+        # The bricks share the list of the queryset
+        self.assertIs(bricks[0].items.items, bricks[2].items.items)
+        with self.assertRaises(IndexError):
+            bricks[2].items[2]
+
+    def test_template_tag_shared_list_brick(self):
+        self._create_list_objects(3)
+        brick = TestSharedListBrick.get_bricks_for_queryset(
+            TestModelC.objects.order_by('pk'))[0]
+        template = Template("{% load bricks %}{% render_brick brick %}")
+        expected = Template("{% load bricks %}{% render_brick brick %}").render(
+            Context({'brick': TestListBrick(list(brick.items))}))
+        self.assertEqual(template.render(Context({'brick': brick})), expected)
+
+    # Fragment cache
+
+    def _create_fragment_bricks(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        return [TestFragmentSingleBrick(b.item) for b in self.bricks[:4]] + [
+            TestFragmentListBrick(b.items) for b in self.bricks[4:]]
+
+    def _render_fragments(self, bricks, **extra_context):
+        cache = caches['default']
+        with mock.patch('djangobricks.templatetags.bricks.get_template',
+                        wraps=get_template) as lookup, \
+                mock.patch.object(cache, 'get_many',
+                                  wraps=cache.get_many) as get_many:
+            html = render_bricks(bricks, **extra_context)
+        return html, lookup.call_count, get_many.call_count
+
+    def test_fragment_cache(self):
+        bricks = self._create_fragment_bricks()
+        html, lookups, _ = self._render_fragments(bricks)
+        self.assertEqual(lookups, 2)
+        cached_html, lookups, round_trips = self._render_fragments(bricks)
+        self.assertEqual(cached_html, html)
+        self.assertEqual(lookups, 0)
+        self.assertEqual(round_trips, 1)
+        # Only the missing bricks are rendered
+        bricks.append(TestSingleBrick(bricks[0].item))
+        html, lookups, _ = self._render_fragments(bricks)
+        self.assertEqual(lookups, 1)
+        self.assertEqual(html.split()[-1], 'objectA1')
+
+    def test_fragment_cache_template_tag(self):
+        bricks = self._create_fragment_bricks()
+        template = Template('{% load bricks %}{% render_brick brick foo="bar" %}')
+        self.assertEqual(template.render(Context({'brick': bricks[0]})).strip(),
+                         'objectA1bar')
+        template = Template('{% load bricks %}{% render_brick brick foo="baz" %}')
+        self.assertEqual(template.render(Context({'brick': bricks[0]})).strip(),
+                         'objectA1baz')
+        with mock.patch('djangobricks.templatetags.bricks.render_to_string') as render:
+            template.render(Context({'brick': bricks[0]}))
+        self.assertFalse(render.called)
+
+    def test_fragment_cache_key(self):
+        bricks = self._create_fragment_bricks()
+        key = bricks[0].get_cache_key()
+        self.assertNotEqual(key, bricks[1].get_cache_key())
+        self.assertNotEqual(key, bricks[0].get_cache_key({'foo': 'bar'}))
+        self.assertNotEqual(key, TestSingleBrick(bricks[0].item).get_cache_key())
+        bricks[0].item.popularity += 1
+        self.assertNotEqual(key, bricks[0].get_cache_key())
+        self.assertIsNone(TestSingleBrick(NotABrick()).get_cache_key())
+
+    def test_fragment_cache_invalidation(self):
+        bricks = self._create_fragment_bricks()
+        connect_fragment_cache(TestModelA, TestModelC)
+        for model in (TestModelA, TestModelC):
+            for name, signal in (('save', post_save), ('delete', post_delete)):
+                self.addCleanup(signal.disconnect, sender=model,
+                                dispatch_uid='djangobricks_fragments_%s' % name)
+        render_bricks(bricks)
+        item = TestModelA.objects.get(pk=bricks[0].item.pk)
+        item.name = 'renamed'
+        item.save()
+        list_item = TestModelC.objects.get(pk=bricks[4].items[1].pk)
+        list_item.name = 'renamed'
+        list_item.save()
+        bricks[0].item.name = bricks[4].items[1].name = 'renamed'
+        html, lookups, _ = self._render_fragments(bricks)
+        self.assertEqual(lookups, 2)
+        self.assertEqual(html.split()[0], 'renamed')
+        self.assertEqual(html.split()[4], 'objectC1renamed')
+
+    # Wall cache
+
+    def _create_cached_wall_factory(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        return TestCachedWallFactory(((Criterion('popularity'), SORTING_DESC),))
+
+    def _get_cached_wall(self, factory, now=None):
+        # Only the clock of the wall cache is mocked, not the one of Django
+        with mock.patch('djangobricks.cache.time') as clock:
+            clock.time.return_value = now or 1000.0
+            clock.sleep.side_effect = self._sleep
+            with CaptureQueriesContext(connection) as queries:
+                wall = factory.wall()
+        return wall, len(queries)
+
+    def _sleep(self, interval):
+        raise AssertionError('Unexpected wait.')
+
+    def test_cached_wall(self):
+        factory = self._create_cached_wall_factory()
+        wall, queries = self._get_cached_wall(factory)
+        self.assertEqual(queries, 2)
+        cached, queries = self._get_cached_wall(factory, 1299.0)
+        self.assertEqual(queries, 0)
+        self.assertEqual([b.item for b in cached], [b.item for b in wall])
+        # The criteria of the factory are restored
+        cached.add([SingleBrick(TestModelA.objects.create(
+            name='new', popularity=6, pub_date=datetime.datetime(2014, 1, 1)))])
+        self.assertEqual(cached[4].item.name, 'new')
+        factory.invalidate_cache()
+        wall, queries = self._get_cached_wall(factory, 1299.0)
+        self.assertEqual(queries, 2)
+        self.assertEqual(wall[4].item.name, 'new')
+
+    def test_cached_wall_stale(self):
+        factory = self._create_cached_wall_factory()
+        self._get_cached_wall(factory)
+        self.brickA1.item.delete()
+        # Another process is building the wall again
+        caches['default'].add('test-wall:lock', True)
+        wall, queries = self._get_cached_wall(factory, 1301.0)
+        self.assertEqual(queries, 0)
+        self.assertEqual(len(wall), 8)
+        caches['default'].delete('test-wall:lock')
+        wall, queries = self._get_cached_wall(factory, 1301.0)
+        self.assertEqual(queries, 2)
+        self.assertEqual(len(wall), 7)
+        self.assertIsNone(caches['default'].get('test-wall:lock'))
+        # Stale walls are dropped in the end
+        wall, queries = self._get_cached_wall(factory, 1301.0 + 601.0)
+        self.assertEqual(queries, 2)
+
+    def test_cached_wall_wait(self):
+        factory = self._create_cached_wall_factory()
+        self._get_cached_wall(factory)
+        entry = caches['default'].get('test-wall')
+        caches['default'].delete('test-wall')
+        caches['default'].add('test-wall:lock', True)
+        sleeps = []
+        def build_elsewhere(interval):
+            sleeps.append(interval)
+            caches['default'].set('test-wall', entry)
+        with mock.patch.object(self, '_sleep', build_elsewhere):
+            wall, queries = self._get_cached_wall(factory)
+        self.assertEqual(len(sleeps), 1)
+        self.assertEqual(queries, 0)
+        self.assertEqual(len(wall), 8)
+
+    # Concurrent build
+
+    def _create_concurrent_bricks(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        return (
+            (Criterion('is_sticky', max, default=False), SORTING_DESC),
+            (Criterion('popularity', max), SORTING_ASC),
+        )
+
+    def _count_fetch_threads(self, factory_class):
+        threads = []
+        fetch = factory_class._fetch_bricks
+        def fetch_bricks(factory, brick, queryset):
+            threads.append(threading.current_thread())
+            return fetch(factory, brick, queryset)
+        return threads, mock.patch.object(factory_class, '_fetch_bricks',
+                                          fetch_bricks)
+
+    def test_concurrent_factory(self):
+        criteria = self._create_concurrent_bricks()
+        expected = list(TestMixedWallFactory(criteria).wall())
+        threads, patch = self._count_fetch_threads(TestConcurrentWallFactory)
+        with patch:
+            wall = TestConcurrentWallFactory(criteria).wall()
+        # Each queryset is read by a thread of the pool
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual([getattr(b, 'item', None) for b in wall],
+                         [getattr(b, 'item', None) for b in expected])
+        self.assertEqual([getattr(b, 'items', None) for b in wall],
+                         [getattr(b, 'items', None) for b in expected])
+
+    def test_concurrent_factory_atomic(self):
+        criteria = self._create_concurrent_bricks()
+        threads, patch = self._count_fetch_threads(TestConcurrentWallFactory)
+        with transaction.atomic(), patch:
+            TestModelA.objects.create(name='objectA5', popularity=1,
+                                      pub_date=datetime.datetime(2014, 1, 1))
+            wall = TestConcurrentWallFactory(criteria).wall()
+            expected = list(TestMixedWallFactory(criteria).wall())
+        # The rows of the transaction are read in the current thread
+        self.assertEqual(threads, [])
+        self.assertIn('objectA5', [b.item.name for b in wall
+                                   if hasattr(b, 'item')])
+        self.assertEqual([getattr(b, 'item', None) for b in wall],
+                         [getattr(b, 'item', None) for b in expected])
+
+    @skipIf(not hasattr(asyncio, 'run'), 'Python is too old')
+    def test_async_factory_lazy_walls(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        for factory_class in (TestPresortedWallFactory, type(
+                str('DeferredFactory'), (TestWallFactory,),
+                {'deferred': True})):
+            expected = [b.item for b in factory_class(criteria).wall()[:3]]
+            wall = asyncio.run(factory_class(criteria).awall())
+            # Slicing on the event loop does not query the database
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual([b.item for b in wall[:3]], expected)
+            self.assertEqual(len(queries), 0)
+
+    @skipIf(not hasattr(asyncio, 'run'), 'Python is too old')
+    def test_async_factory(self):
+        criteria = self._create_concurrent_bricks()
+        expected = list(TestMixedWallFactory(criteria).wall())
+        threads, patch = self._count_fetch_threads(TestConcurrentWallFactory)
+        with patch:
+            wall = asyncio.run(TestConcurrentWallFactory(criteria).awall())
+        self.assertEqual(len(threads), 2)
+        self.assertEqual([getattr(b, 'item', None) for b in wall],
+                         [getattr(b, 'item', None) for b in expected])
+        self.assertEqual([getattr(b, 'items', None) for b in wall],
+                         [getattr(b, 'items', None) for b in expected])
+
+    # Async API
+
+    @skipIf(not hasattr(asyncio, 'run'), 'Python is too old')
+    def test_aget_bricks_for_queryset(self):
+        objects = self._create_list_objects(7)
+        for brick_class in (TestSingleBrick, TestListBrick):
+            expected = list(brick_class.get_bricks_for_queryset(
+                TestModelC.objects.order_by('pk')))
+            for content in (TestModelC.objects.order_by('pk'),
+                            AsyncList(objects)):
+                bricks = asyncio.run(brick_class.aget_bricks_for_queryset(content))
+                self.assertEqual([getattr(b, 'item', None) for b in bricks],
+                                 [getattr(b, 'item', None) for b in expected])
+                self.assertEqual([getattr(b, 'items', None) for b in bricks],
+                                 [getattr(b, 'items', None) for b in expected])
+
+    @skipIf(not hasattr(asyncio, 'run'), 'Python is too old')
+    def test_async_factory_bricks(self):
+        criteria = self._create_concurrent_bricks()
+        expected = list(TestMixedWallFactory(criteria).wall())
+        with mock.patch.object(TestListBrick, 'aget_bricks_for_queryset',
+                               wraps=TestListBrick.aget_bricks_for_queryset) as aget:
+            wall = asyncio.run(TestMixedWallFactory(criteria).awall())
+        self.assertEqual(aget.call_count, 1)
+        self.assertEqual([getattr(b, 'items', None) for b in wall],
+                         [getattr(b, 'items', None) for b in expected])
+        deferred = asyncio.run(TestDeferredMixedWallFactory(criteria).awall())
+        self.assertEqual([getattr(b, 'items', None) for b in deferred],
+                         [getattr(b, 'items', None) for b in expected])
+
+    @skipIf(not hasattr(asyncio, 'run'), 'Python is too old')
+    def test_arender_bricks(self):
+        from djangobricks.asynchronous import arender_bricks
+        bricks = self._create_render_wall_bricks()
+        html = asyncio.run(arender_bricks(bricks, foo='bar'))
+        self.assertEqual(html, render_bricks(bricks, foo='bar'))
+
+    # Related objects
+
+    def _create_related_objects(self):
+        for i in range(3):
+            thread = TestThread.objects.create(comment_count=i)
+            for j in range(2):
+                TestPost.objects.create(name='post%s%s' % (i, j), thread=thread)
+
+    def test_criterion_related_paths(self):
+        self.assertEqual(Criterion('popularity').get_related_paths(), [])
+        self.assertEqual(Criterion('thread__comment_count').get_related_paths(),
+                         ['thread'])
+        self.assertEqual(
+            ExpressionCriterion('count', F('popularity')).get_related_paths(), [])
+
+    def test_factory_related(self):
+        factory = TestRelatedWallFactory((
+            (Criterion('thread__comment_count'), SORTING_DESC),
+            (Criterion('posts__name', max), SORTING_DESC),
+            (Criterion('thread__posts__name', max), SORTING_DESC),
+            (Criterion('name__upper'), SORTING_DESC),
+        ))
+        self.assertEqual(
+            factory.get_related(TestPostBrick, TestPost.objects.all()),
+            (['thread'], ['thread__posts']))
+        self.assertEqual(
+            factory.get_related(TestThreadBrick, TestThread.objects.all()),
+            ([], ['posts']))
+
+    def test_factory_related_annotations(self):
+        factory = TestRelatedWallFactory((
+            (Criterion('posts__count'), SORTING_DESC),
+            (Criterion('posts__name__max'), SORTING_DESC),
+        ))
+        queryset = TestThread.objects.annotate(Count('posts'),
+                                               Max('posts__name'))
+        self.assertEqual(factory.get_related(SingleBrick, queryset), ([], []))
+        self.assertEqual(
+            factory.get_related(SingleBrick, TestThread.objects.all()),
+            ([], ['posts']))
+
+    def test_factory_related_queries(self):
+        self._create_related_objects()
+        criteria = ((Criterion('pk'), SORTING_ASC),)
+        for factory_class in (TestRelatedWallFactory, type(
+                str('DeferredFactory'), (TestRelatedWallFactory,),
+                {'deferred': True})):
+            with CaptureQueriesContext(connection) as queries:
+                bricks = list(factory_class(criteria).wall())
+                names = [b.item.thread.comment_count if hasattr(b.item, 'thread')
+                         else [p.name for p in b.item.posts.all()]
+                         for b in bricks]
+            # Posts and threads, then the posts of the threads, plus the keys
+            # of each queryset when deferred
+            self.assertEqual(len(queries), 5 if factory_class.deferred else 3)
+            self.assertEqual(len(names), 9)
+
+    def test_factory_related_list_content(self):
+        self._create_related_objects()
+        posts = list(TestPost.objects.select_related('thread'))
+        criteria = ((Criterion('thread__comment_count'), SORTING_DESC),
+                    (Criterion('pk'), SORTING_ASC))
+        wall = wall_factory([posts], TestPostBrick, criteria)
+        self.assertEqual([b.item for b in wall],
+                         sorted(posts, key=lambda p: (-p.thread.comment_count,
+                                                      p.pk)))
+
+    # Criterion paths
+
+    def test_criterion_path(self):
+        self._create_related_objects()
+        post = TestPost.objects.select_related('thread').get(name='post20')
+        criterion = Criterion('thread__comment_count')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(criterion.get_value_for_item(post), 2)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(Criterion('thread__i_dont_exist', default=0)
+                         .get_value_for_item(post), 0)
+        # Not a path
+        self.assertEqual(Criterion('__str__').get_value_for_item(post), 'post20')
+
+    def test_criterion_aggregate_alias(self):
+        self._create_related_objects()
+        threads = list(TestThread.objects.annotate(
+            Max('posts__name'), Count('posts')).order_by('pk'))
+        name = Criterion('posts__name__max')
+        count = Criterion('posts__count')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual([name.get_value_for_item(t) for t in threads],
+                             ['post01', 'post11', 'post21'])
+            self.assertEqual(name.get_values_for_items(threads),
+                             ['post01', 'post11', 'post21'])
+            self.assertEqual([count.get_value_for_item(t) for t in threads],
+                             [2, 2, 2])
+            self.assertEqual(count.get_values_for_items(threads), [2, 2, 2])
+        self.assertEqual(len(queries), 0)
+
+    def test_criterion_path_dict(self):
+        item = TestModelA(name='objectA1', popularity=5)
+        item.data = {'stats': {'views': 3, 'items': 7, 'none': None}}
+        self.assertEqual(Criterion('data__stats__views').get_value_for_item(item), 3)
+        self.assertEqual(Criterion('data__stats__items').get_value_for_item(item), 7)
+        self.assertIsNone(Criterion('data__stats__none', default=1)
+                          .get_value_for_item(item))
+        self.assertEqual(Criterion('data__stats__none__views', default=1)
+                         .get_value_for_item(item), 1)
+        self.assertEqual(Criterion('data__i_dont_exist__views', default=1)
+                         .get_value_for_item(item), 1)
+        self.assertEqual(Criterion('data__stats__views__bogus', default=1)
+                         .get_value_for_item(item), 1)
+
+    def test_criterion_path_missing_relation(self):
+        thread = TestThread(comment_count=0)
+        post = TestPost(name='post')
+        self.assertEqual(Criterion('thread__comment_count', default=lambda: -1)
+                         .get_value_for_item(post), -1)
+        post.thread = thread
+        self.assertEqual(Criterion('thread__comment_count', default=-1)
+                         .get_value_for_item(post), 0)
+
+    def test_criterion_path_in_wall(self):
+        self._create_related_objects()
+        factory = TestRelatedWallFactory((
+            (Criterion('thread__comment_count', default=-1), SORTING_DESC),
+            (Criterion('name', default=''), SORTING_ASC),
+        ))
+        names = [str(brick.item) for brick in factory.wall()]
+        self.assertEqual(names[:6], ['post20', 'post21', 'post10', 'post11',
+                                     'post00', 'post01'])
+
+    # Criteria columns
+
+    def test_criterion_get_values(self):
+        self._create_model_a_objects_and_bricks()
+        listBrick = ListBrick([self.brickA1.item, self.brickA2.item])
+        bricks = [self.brickA4, listBrick, self.brickA1]
+        criterion = Criterion('callable_popularity', max, default=0)
+        self.assertEqual(criterion.get_values(bricks), [2, 5, 5])
+        self.assertEqual(criterion.get_values([]), [])
+        self.assertEqual(Criterion('i_dont_exist', default=lambda: 1)
+                         .get_values(bricks), [1, 1, 1])
+
+    def test_criterion_get_values_for_items(self):
+        item = TestModelA(name='objectA1', popularity=5)
+        item.data = {'views': 3}
+        other = TestModelA(name='objectA2', popularity=4)
+        self.assertEqual(Criterion('popularity').get_values_for_items(
+            [item, other]), [5, 4])
+        self.assertEqual(Criterion('data__views', default=0)
+                         .get_values_for_items([item, other]), [3, 0])
+
+    def test_brick_get_values_for_criterion(self):
+        self._create_model_a_objects_and_bricks()
+        calls = []
+
+        class BulkBrick(SingleBrick):
+            @classmethod
+            def get_values_for_criterion(cls, criterion, bricks):
+                calls.append(len(bricks))
+                return [-brick.item.popularity for brick in bricks]
+
+        class OverriddenBrick(SingleBrick):
+            def get_value_for_criterion(self, criterion):
+                return 0
+
+        bricks = [BulkBrick(brick.item) for brick in self.bricks]
+        bricks.append(OverriddenBrick(self.brickA1.item))
+        wall = TestBrickWall(bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        self.assertEqual(list(wall), bricks[:4] + [bricks[4]])
+        self.assertEqual(calls, [4])
+
+    def test_wall_get_sort_key_overridden(self):
+        self._create_model_a_objects_and_bricks()
+
+        class ReversedWall(TestBrickWall):
+            def get_sort_key(self, brick):
+                return (-brick.item.popularity,)
+
+        wall = ReversedWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_DESC),
+        ))
+        self.assertEqual(list(wall), self.bricks[::-1])
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_lexsort(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        self.bricks.append(SingleBrick(TestModelA(name='objectA5',
+                                                  popularity=2 ** 64)))
+        criteria = (
+            (Criterion('is_sticky', default=False), SORTING_DESC),
+            (Criterion('popularity', default=0.5), SORTING_ASC),
+        )
+        expected = list(TestBrickWall(self.bricks, criteria))
+        for bricks in (self.bricks, self.bricks[:-1]):
+            wall = TestBrickWall(bricks, criteria)
+            wall.lexsort_threshold = 0
+            self.assertEqual(list(wall), [b for b in expected if b in bricks])
+        self.assertEqual(list(wall[:2]), [self.brickA3, self.brickB3])
+        # Dates are sorted in Python
+        criteria = ((Criterion('pub_date', default=datetime.datetime.now),
+                     SORTING_DESC),)
+        wall = TestBrickWall(self.bricks[:4], criteria)
+        wall.lexsort_threshold = 0
+        self.assertEqual(list(wall), self.bricks[:4][::-1])
+        wall = TestBrickWall([], criteria)
+        wall.lexsort_threshold = 0
+        self.assertEqual(list(wall), [])
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_lexsort_multi_ordering(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        orderings = {
+            'sticky': ((Criterion('is_sticky'), SORTING_DESC),
+                       (Criterion('popularity'), SORTING_ASC)),
+        }
+        wall = MultiOrderingWall(self.bricks, orderings)
+        wall.lexsort_threshold = 0
+        expected = MultiOrderingWall(self.bricks, orderings)
+        self.assertEqual(list(wall.ordering('sticky')),
+                         list(expected.ordering('sticky')))
+        empty = MultiOrderingWall([], orderings)
+        empty.lexsort_threshold = 0
+        self.assertEqual(list(empty.ordering('sticky')), [])
+
+    # Indexed filtering
+
+    def test_filter_by(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        bricks = [TestSingleBrick(brick.item) for brick in self.bricks[:4]]
+        bricks.extend(self.bricks[4:])
+        wall = TestIndexedBrickWall(bricks, criteria=(
+            (Criterion('popularity'), SORTING_DESC),
+        ))
+        expected = list(wall.filter(lambda b: isinstance(b, TestSingleBrick)))
+        self.assertEqual(list(wall.filter_by(brick_class=TestSingleBrick)),
+                         expected)
+        self.assertEqual(list(wall.filter_by(brick_class=SingleBrick)),
+                         list(wall))
+        self.assertEqual(list(wall.filter_by(brick_class=(TestListBrick,))), [])
+        self.assertEqual(list(wall.filter_by(is_sticky=True)),
+                         [self.brickB3, bricks[2]])
+        self.assertEqual(
+            list(wall.filter_by(brick_class=TestSingleBrick, is_sticky=True)),
+            [bricks[2]])
+        self.assertEqual(list(wall.filter_by(is_sticky=True, popularity=8)),
+                         [self.brickB3])
+        self.assertEqual(list(wall.filter_by(name='objectA2')), [bricks[1]])
+        self.assertEqual(list(wall.filter_by()), list(wall))
+        self.assertEqual(len(wall.filter_by(is_sticky=False)), 6)
+
+    def test_filter_by_index_reused(self):
+        self._create_model_a_objects_and_bricks()
+        calls = []
+
+        class CountingCriterion(Criterion):
+            def get_values(self, bricks):
+                calls.append(len(bricks))
+                return super(CountingCriterion, self).get_values(bricks)
+
+        class Wall(BaseWall):
+            indexes = (CountingCriterion('is_sticky'),)
+
+        wall = Wall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        self.assertEqual(list(wall.filter_by(is_sticky=True)), [self.brickA3])
+        self.assertEqual(list(wall.filter_by(is_sticky=False)),
+                         [self.brickA4, self.brickA2, self.brickA1])
+        self.assertEqual(calls, [4])
+        # The filtered walls have indexes of their own
+        filtered = wall.filter_by(is_sticky=False)
+        self.assertEqual(list(filtered.filter_by(is_sticky=False)),
+                         [self.brickA4, self.brickA2, self.brickA1])
+        self.assertEqual(list(wall.filter(callback_filter_a)
+                              .filter_by(is_sticky=True)), [self.brickA3])
+
+    def test_filter_by_after_update(self):
+        self._create_model_a_objects_and_bricks()
+        wall = TestIndexedBrickWall(self.bricks[:3], criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        self.assertEqual(list(wall.filter_by(is_sticky=False)),
+                         [self.brickA2, self.brickA1])
+        wall.add([self.brickA4])
+        self.assertEqual(list(wall.filter_by(is_sticky=False)),
+                         [self.brickA4, self.brickA2, self.brickA1])
+        wall.remove(lambda brick: brick is self.brickA2)
+        self.assertEqual(list(wall.filter_by(is_sticky=False)),
+                         [self.brickA4, self.brickA1])
+        wall.set_criteria(((Criterion('popularity'), SORTING_DESC),))
+        self.assertEqual(list(wall.filter_by(is_sticky=False)),
+                         [self.brickA1, self.brickA4])
+
+    def test_filter_by_pickle(self):
+        import pickle
+        self._create_model_a_objects_and_bricks()
+        wall = TestIndexedBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        wall = pickle.loads(pickle.dumps(wall))
+        self.assertEqual(sorted(wall._indexes), ['is_sticky', 'popularity'])
+        self.assertEqual([b.item for b in wall.filter_by(is_sticky=False)],
+                         [self.brickA4.item, self.brickA2.item,
+                          self.brickA1.item])
+        wall.filter_by(brick_class=TestSingleBrick)
+        wall = pickle.loads(pickle.dumps(wall))
+        self.assertEqual(sorted(wall._indexes),
+                         ['brick_class', 'is_sticky', 'popularity'])
+
+    def test_filter_by_pickle_no_indexes(self):
+        import pickle
+        self._create_model_a_objects_and_bricks()
+        wall = BaseWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        wall = pickle.loads(pickle.dumps(wall))
+        self.assertEqual(wall._indexes, None)
+
+    def test_filter_by_list_brick(self):
+        self._create_model_c_objects_and_bricks()
+        criteria = ((Criterion('popularity', max), SORTING_DESC),)
+        wall = BaseWall(self.bricks, criteria)
+        self.assertRaises(ValueError, wall.filter_by, is_sticky=True)
+        wall.indexes = (Criterion('is_sticky', any),)
+        self.assertEqual(list(wall.filter_by(is_sticky=True)), [self.brickC2])
+
+    def test_filter_by_deferred(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        criteria = ((Criterion('popularity', max), SORTING_DESC),)
+        wall = TestDeferredMixedWallFactory(criteria).wall()
+        expected = list(wall.filter(lambda b: isinstance(b, TestListBrick)))
+        filtered = wall.filter_by(brick_class=TestListBrick)
+        self.assertTrue(expected)
+        self.assertEqual([b.items for b in filtered],
+                         [b.items for b in expected])
+
+    def test_filter_by_deferred_attribute(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        factory_class = type(str('DeferredFactory'), (TestWallFactory,),
+                             {'deferred': True})
+        wall = factory_class(criteria).wall()
+        expected = [b.item for b in TestWallFactory(criteria).wall()
+                    if b.item.is_sticky]
+        with CaptureQueriesContext(connection) as queries:
+            filtered = wall.filter_by(is_sticky=True)
+        # One query per queryset, not per brick
+        self.assertEqual(len(queries), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual([b.item for b in filtered], expected)
+        self.assertEqual(len(queries), 0)
+
+    def test_filter_by_cached_criteria(self):
+        self._create_model_a_objects_and_bricks()
+        bricks = [TestCachedSingleBrick(b.item) for b in self.bricks]
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        BaseWall(bricks, criteria).filter_by(is_sticky=True)
+        sizes = [len(brick._criteria_cache) for brick in bricks]
+        BaseWall(bricks, criteria).filter_by(is_sticky=True)
+        self.assertEqual([len(brick._criteria_cache) for brick in bricks],
+                         sizes)
+
+    def test_filter_compact_wall(self):
+        self._create_model_a_objects_and_bricks()
+        wall = TestCompactBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        filtered = wall.filter(callback_filter_a)
+        self.assertEqual(list(filtered),
+                         [self.brickA4, self.brickA3, self.brickA2,
+                          self.brickA1])
+
+    # Lazy filtering
+
+    def _counting_filter(self, callback, calls):
+        def counting(brick):
+            calls.append(brick)
+            return callback(brick)
+        return counting
+
+    def test_filter_lazy(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        sorted_lengths = []
+
+        class CountingCriterion(Criterion):
+            def get_values(self, bricks):
+                sorted_lengths.append(len(bricks))
+                return super(CountingCriterion, self).get_values(bricks)
+
+        calls = []
+        wall = TestBrickWall(self.bricks, criteria=(
+            (CountingCriterion('popularity'), SORTING_ASC),
+        ))
+        filtered = wall.filter(self._counting_filter(callback_filter_a, calls))
+        self.assertEqual(calls, [])
+        self.assertEqual(len(filtered), 4)
+        self.assertEqual(list(filtered),
+                         [self.brickA4, self.brickA3, self.brickA2, self.brickA1])
+        self.assertEqual(len(calls), 8)
+        # Only the accepted bricks are sorted, the wall is not
+        self.assertEqual(sorted_lengths, [4])
+        self.assertIsNone(wall._sorted)
+
+    def test_filter_fused(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        calls_a, calls_sticky = [], []
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        filtered = wall.filter(
+            self._counting_filter(callback_filter_a, calls_a))
+        chained = filtered.filter(self._counting_filter(
+            lambda brick: not brick.item.is_sticky, calls_sticky))
+        self.assertEqual(list(chained),
+                         [self.brickA4, self.brickA2, self.brickA1])
+        self.assertEqual(len(calls_a), 8)
+        self.assertEqual(len(calls_sticky), 4)
+        # The intermediate wall is still usable on its own
+        self.assertEqual(list(filtered),
+                         [self.brickA4, self.brickA3, self.brickA2, self.brickA1])
+        self.assertEqual(len(calls_a), 16)
+        # Once read, it is filtered again on its own
+        self.assertEqual(list(filtered.filter(callback_filter_a)),
+                         [self.brickA4, self.brickA3, self.brickA2, self.brickA1])
+        self.assertEqual(len(calls_a), 16)
+
+    def test_filter_fused_keeps_state(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_ASC),
+        ))
+        filtered = wall.filter(callback_filter_a)
+        filtered.set_criteria(((Criterion('popularity'), SORTING_DESC),))
+        filtered.extra = 'extra'
+        chained = filtered.filter(lambda brick: brick.item.popularity < 10)
+        self.assertEqual(list(chained), [self.brickA1, self.brickA2,
+                                         self.brickA3, self.brickA4])
+        self.assertEqual(chained.extra, 'extra')
+        # Without changes, the filters are still fused
+        calls = []
+        filtered = wall.filter(self._counting_filter(callback_filter_a, calls))
+        filtered.extra = 'extra'
+        chained = filtered.filter(callback_filter_a)
+        self.assertEqual(chained.extra, 'extra')
+        self.assertEqual(list(chained), [self.brickA4, self.brickA3,
+                                         self.brickA2, self.brickA1])
+        self.assertEqual(len(calls), 8)
+
+    def test_filter_sorted_wall_slice(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        calls = []
+        wall = TestBrickWall(self.bricks, criteria=(
+            (Criterion('popularity'), SORTING_DESC),
+        ))
+        wall.sorted
+        filtered = wall.filter(self._counting_filter(callback_filter_b, calls))
+        self.assertEqual(filtered[:2], [self.brickB1, self.brickB2])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(filtered), 4)
+        self.assertEqual(len(calls), 8)
+        self.assertEqual(list(filtered), [self.brickB1, self.brickB2,
+                                          self.brickB3, self.brickB4])
+        filtered.add([self.brickA1])
+        self.assertEqual(list(filtered)[-1], self.brickA1)
+
+    def test_filter_merged_wall(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        criteria = ((Criterion('popularity'), SORTING_DESC),)
+        wall = TestBrickWall.merged([self.bricks[4:], self.bricks[:4]], criteria)
+        filtered = wall.filter([callback_filter_a, callback_filter_b], 'OR')
+        self.assertEqual(len(filtered), 8)
+        self.assertEqual(list(filtered), self.bricks[4:] + self.bricks[:4])
+
+    # Cursor pages
+
+    def _read_pages(self, factory, size):
+        pages = []
+        cursor = None
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page, cursor = factory.get_page(cursor, size)
+            # A single query per queryset, whatever the page
+            self.assertEqual(len(queries), 2)
+            pages.append([brick.item for brick in page])
+            if cursor is None:
+                return pages
+
+    def test_cursor_pages(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        # Ties within a queryset and across querysets
+        TestModelA.objects.create(name='objectA5', popularity=7,
+            pub_date=datetime.datetime(2014, 1, 1, 12, 0), is_sticky=False)
+        TestModelA.objects.create(name='objectA6', popularity=7,
+            pub_date=datetime.datetime(2015, 1, 1, 12, 0), is_sticky=False)
+        TestModelB.objects.create(name='objectB5', popularity=5,
+            date_add=datetime.datetime(2010, 1, 1, 12, 0), is_sticky=False)
+        for orders in ((SORTING_DESC, SORTING_DESC), (SORTING_ASC, SORTING_DESC),
+                       (SORTING_ASC, SORTING_ASC)):
+            criteria = (
+                (Criterion('is_sticky'), orders[0]),
+                (Criterion('popularity'), orders[1]),
+            )
+            expected = [b.item for b in TestWallFactory(criteria).wall()]
+            for size in (1, 3, 11):
+                pages = self._read_pages(TestWallFactory(criteria), size)
+                self.assertEqual([len(page) for page in pages[:-1]],
+                                 [size] * (len(pages) - 1))
+                self.assertEqual(sum(pages, []), expected)
+
+    def test_cursor_dates(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        criteria = ((Criterion('pub_date'), SORTING_DESC),)
+
+        class DateWallFactory(BaseWallFactory):
+            page_size = 2
+
+            def get_content(self):
+                return ((TestSingleBrick, TestModelA.objects.all()),
+                        (TestSingleBrick, TestModelC.objects.all()))
+        factory = DateWallFactory(criteria)
+        expected = [b.item for b in factory.wall()]
+        page, cursor = factory.get_page()
+        self.assertEqual([b.item for b in page], expected[:2])
+        page, cursor = factory.get_page(cursor)
+        self.assertEqual([b.item for b in page], expected[2:4])
+
+    def test_cursor_microseconds(self):
+        start = datetime.datetime(2010, 1, 1, 12, 0)
+        for i in range(12):
+            # Values within the same millisecond
+            TestModelA.objects.create(name='A%d' % i, popularity=i,
+                pub_date=start + datetime.timedelta(microseconds=i * 7))
+            TestModelC.objects.create(name='C%d' % i, popularity=i,
+                pub_date=start + datetime.timedelta(microseconds=i * 5 + 1))
+
+        class DateWallFactory(BaseWallFactory):
+            def get_content(self):
+                return ((TestSingleBrick, TestModelA.objects.all()),
+                        (TestSingleBrick, TestModelC.objects.all()))
+        for order in (SORTING_ASC, SORTING_DESC):
+            factory = DateWallFactory(((Criterion('pub_date'), order),))
+            expected = [b.item for b in factory.wall()]
+            pages = self._read_pages(factory, 5)
+            self.assertEqual(sum(pages, []), expected)
+
+    def test_cursor_invalid(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_b_objects_and_bricks()
+        factory = TestWallFactory(((Criterion('popularity'), SORTING_DESC),))
+        _, cursor = factory.get_page(size=2)
+        with self.assertRaises(InvalidCursor):
+            factory.get_page('bogus')
+        with self.assertRaises(InvalidCursor):
+            factory.get_page(cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'))
+        with self.assertRaises(TypeError):
+            TestMixedWallFactory().get_page()
+
+    # Slotted bricks
+
+    def test_slotted_brick(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        bricks = [TestSlottedSingleBrick(b.item) for b in self.bricks[:4]] + [
+            TestSlottedListBrick(b.items) for b in self.bricks[4:]]
+        for brick in bricks:
+            self.assertFalse(hasattr(brick, '__dict__'))
+        criteria = (
+            (Criterion('is_sticky', max, default=False), SORTING_DESC),
+            (Criterion('popularity', max), SORTING_ASC),
+        )
+        expected = list(TestBrickWall(self.bricks, criteria))
+        wall = TestBrickWall(bricks, criteria)
+        self.assertEqual([getattr(b, 'item', None) for b in wall],
+                         [getattr(b, 'item', None) for b in expected])
+        self.assertEqual([getattr(b, 'items', None) for b in wall],
+                         [getattr(b, 'items', None) for b in expected])
+        self.assertHTMLEqual(render_bricks(wall[:1]), 'objectA3')
+        # The slotted bricks are compacted like the others
+        import pickle
+        unpickled = pickle.loads(pickle.dumps(
+            TestCompactBrickWall(bricks, criteria)))
+        self.assertEqual([b.__class__ for b in unpickled],
+                         [b.__class__ for b in wall])
+        self.assertEqual([getattr(b, 'item', None) for b in unpickled],
+                         [getattr(b, 'item', None) for b in wall])
+
+    def test_slotted_brick_pickle(self):
+        import pickle
+        self._create_model_a_objects_and_bricks()
+        criterion = Criterion('popularity')
+        brick = TestSlottedCachedBrick(self.brickA1.item)
+        brick.extra = 'extra'
+        self.assertEqual(brick.get_cached_value_for_criterion(criterion), 5)
+        unpickled = pickle.loads(pickle.dumps(brick))
+        self.assertEqual(unpickled.item, brick.item)
+        self.assertEqual(unpickled.extra, 'extra')
+        self.assertFalse(hasattr(unpickled, '_criteria_cache'))
+        # Subclasses without slots keep their attributes as well
+        brick = TestSingleBrick(self.brickA1.item)
+        brick.extra = 'extra'
+        unpickled = pickle.loads(pickle.dumps(brick))
+        self.assertEqual(unpickled.item, brick.item)
+        self.assertEqual(unpickled.extra, 'extra')
+
+    def test_plain_bricks_unchanged(self):
+        import weakref
+        self._create_model_a_objects_and_bricks()
+
+        class SlottedMixin(object):
+            __slots__ = ('extra',)
+
+        class MixedBrick(SingleBrick, SlottedMixin):
+            pass
+        for brick in (SingleBrick(self.brickA1.item),
+                      ListBrick([self.brickA1.item]),
+                      MixedBrick(self.brickA1.item)):
+            brick.other = 1
+            self.assertEqual(vars(brick)['other'], 1)
+            self.assertIs(weakref.ref(brick)(), brick)
+
+    # Metrics
+
+    def _record_metrics(self):
+        recorded = []
+        callback = lambda name, value, tags: recorded.append((name, value, tags))
+        metrics.add_callback(callback)
+        self.addCleanup(metrics.remove_callback, callback)
+        return recorded
+
+    def _get_metrics(self, recorded, name):
+        return [(value, tags) for metric, value, tags in recorded
+                if metric == name]
+
+    def test_metrics_disabled(self):
+        self._create_model_a_objects_and_bricks()
+        with mock.patch.object(metrics, 'emit') as emit:
+            wall = TestMixedWallFactory((
+                (Criterion('popularity', max), SORTING_DESC),
+            )).build_wall()
+            list(wall.filter(callback_filter_a))
+            render_bricks(wall[:2])
+        self.assertFalse(emit.called)
+
+    def test_metrics_wall(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        recorded = self._record_metrics()
+        wall = TestMixedWallFactory((
+            (Criterion('is_sticky', max, default=False), SORTING_DESC),
+            (Criterion('popularity', max), SORTING_ASC),
+        )).build_wall()
+        self.assertEqual(self._get_metrics(recorded, 'bricks.wall.build')[0][1],
+                         {'factory': 'TestMixedWallFactory'})
+        sources = self._get_metrics(recorded, 'bricks.source.bricks')
+        self.assertEqual(sources, [
+            (4, {'brick': 'TestSingleBrick', 'model': 'djangobricks.TestModelA'}),
+            (1, {'brick': 'TestListBrick', 'model': 'djangobricks.TestModelC'}),
+        ])
+        queries = self._get_metrics(recorded, 'bricks.source.queries')
+        self.assertEqual([value for value, _ in queries], [1, 1])
+        del recorded[:]
+        # The bricks are filtered, then sorted
+        list(wall.filter(lambda brick: isinstance(brick, TestSingleBrick)))
+        self.assertEqual(self._get_metrics(recorded, 'bricks.criteria.evaluations'),
+                         [(8, {'wall': 'BaseWall'})])
+        self.assertEqual(len(self._get_metrics(recorded, 'bricks.wall.sort')), 1)
+        self.assertEqual(self._get_metrics(recorded, 'bricks.wall.filter.bricks'),
+                         [(5, {'wall': 'BaseWall'})])
+
+    @skipIf(not hasattr(asyncio, 'run'), 'Python is too old')
+    def test_metrics_async_wall(self):
+        self._create_model_a_objects_and_bricks()
+        self._create_model_c_objects_and_bricks()
+        recorded = self._record_metrics()
+        criteria = ((Criterion('popularity', max), SORTING_ASC),)
+        asyncio.run(TestMixedWallFactory(criteria).awall())
+        # The querysets are read together, so they end in any order
+        sources = self._get_metrics(recorded, 'bricks.source.bricks')
+        self.assertEqual(sorted(sources, key=lambda source: source[0]), [
+            (1, {'brick': 'TestListBrick', 'model': 'djangobricks.TestModelC'}),
+            (4, {'brick': 'TestSingleBrick', 'model': 'djangobricks.TestModelA'}),
+        ])
+        self.assertEqual(len(self._get_metrics(recorded, 'bricks.source.time')), 2)
+        self.assertEqual(self._get_metrics(recorded, 'bricks.source.queries'), [])
+
+    def test_metrics_render(self):
+        bricks = self._create_fragment_bricks()
+        recorded = self._record_metrics()
+        render_bricks(bricks)
+        self.assertEqual(
+            sorted((tags['template'], value) for value, tags in
+                   self._get_metrics(recorded, 'bricks.render.bricks')),
+            [('list_brick.html', 2), ('single_brick.html', 4)])
+        self.assertEqual(self._get_metrics(recorded, 'bricks.render.cache_misses'),
+                         [(6, {})])
+        del recorded[:]
+        render_bricks(bricks)
+        self.assertEqual(self._get_metrics(recorded, 'bricks.render.cache_hits'),
+                         [(6, {})])
+        self.assertEqual(self._get_metrics(recorded, 'bricks.render'), [])